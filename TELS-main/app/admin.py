@@ -1,9 +1,53 @@
 import json
+import re
+from functools import lru_cache
 from django import forms
 from django.contrib import admin
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Func, IntegerField
 
-from .models import Customer, TEPCode, Material, MaterialList, Forecast
+from .models import Customer, TEPCode, Material, MaterialList, Forecast, MONTH_NAMES, ABBR_TO_MONTH
+from .signals import drop_dashboard_counts
+
+
+class JSONArrayLength(Func):
+    """Length of a JSON array column, computed in the database."""
+    function = "JSON_ARRAY_LENGTH"
+    output_field = IntegerField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function="JSONB_ARRAY_LENGTH", **extra_context)
+
+
+def _on_changelist(model_admin, request):
+    """
+    True when `request` is the model's changelist. Its get_queryset() also
+    backs the change form, delete view and autocomplete, which don't need
+    the list-column annotations.
+    """
+    opts = model_admin.opts
+    match = request.resolver_match
+    return bool(match) and match.url_name == f"{opts.app_label}_{opts.model_name}_changelist"
+
+
+def _parse_json_array(raw, not_list_message):
+    """
+    Shared by the JSON textarea fields: blank is an empty list, anything
+    else must decode to a JSON array.
+    """
+    raw = (raw or "").strip()
+    if not raw:
+        return []
+
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValidationError(f"Invalid JSON: {e}")
+
+    if not isinstance(data, list):
+        raise ValidationError(not_list_message)
+    return data
 
 
 class TEPCodeInline(admin.TabularInline):
@@ -39,32 +83,32 @@ class CustomerAdminForm(forms.ModelForm):
             )
 
     def clean_parts_json(self):
-        raw = (self.cleaned_data.get("parts_json") or "").strip()
-
-        if raw == "":
-            return []
-
-        try:
-            data = json.loads(raw)
-        except json.JSONDecodeError as e:
-            raise ValidationError(f"Invalid JSON: {e}")
-
-        if not isinstance(data, list):
-            raise ValidationError("Parts must be a JSON ARRAY (list).")
+        data = _parse_json_array(
+            self.cleaned_data.get("parts_json"), "Parts must be a JSON ARRAY (list)."
+        )
 
+        errors = []
         for i, item in enumerate(data):
             if not isinstance(item, dict):
-                raise ValidationError(f"Item #{i+1} must be an object/dict.")
+                errors.append(f"Item #{i+1} must be an object/dict.")
+                continue
             if "Partcode" not in item or "Partname" not in item:
-                raise ValidationError(f"Item #{i+1} must contain Partcode and Partname.")
+                errors.append(f"Item #{i+1} must contain Partcode and Partname.")
+                continue
+
+            partcode = str(item["Partcode"]).strip()
+            partname = str(item["Partname"]).strip()
 
-            if not str(item["Partcode"]).strip():
-                raise ValidationError(f"Item #{i+1}: Partcode cannot be empty.")
-            if not str(item["Partname"]).strip():
-                raise ValidationError(f"Item #{i+1}: Partname cannot be empty.")
+            if not partcode:
+                errors.append(f"Item #{i+1}: Partcode cannot be empty.")
+            if not partname:
+                errors.append(f"Item #{i+1}: Partname cannot be empty.")
 
-            item["Partcode"] = str(item["Partcode"]).strip()
-            item["Partname"] = str(item["Partname"]).strip()
+            item["Partcode"] = partcode
+            item["Partname"] = partname
+
+        if errors:
+            raise ValidationError(errors)
 
         return data
 
@@ -80,13 +124,25 @@ class CustomerAdmin(admin.ModelAdmin):
 
     inlines = [TEPCodeInline]
 
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        # The change form needs parts, so it is only deferred for the list.
+        if _on_changelist(self, request):
+            qs = (
+                qs.annotate(_tep_count=Count("tep_codes"), _parts_count=JSONArrayLength("parts"))
+                .defer("parts")
+            )
+        return qs
+
     def parts_count(self, obj: Customer):
-        return len(obj.parts or [])
+        return obj._parts_count or 0
     parts_count.short_description = "Parts"
+    parts_count.admin_order_field = "_parts_count"
 
     def tep_count(self, obj: Customer):
-        return obj.tep_codes.count()
+        return obj._tep_count
     tep_count.short_description = "TEP Codes"
+    tep_count.admin_order_field = "_tep_count"
 
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
@@ -95,6 +151,11 @@ class CustomerAdmin(admin.ModelAdmin):
         obj.save()
 
 
+MATERIAL_UNITS = frozenset(code for code, _ in Material.UNIT_CHOICES)
+MATERIAL_REQUIRED_KEYS = ("mat_partcode", "mat_partname", "mat_maker", "unit", "dim_qty", "total")
+MATERIAL_SYNC_FIELDS = ("mat_partname", "mat_maker", "unit", "dim_qty", "loss_percent", "total")
+
+
 class TEPCodeAdminForm(forms.ModelForm):
     materials_json = forms.CharField(
         required=False,
@@ -114,19 +175,17 @@ class TEPCodeAdminForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
 
         if self.instance and self.instance.pk:
-            materials = self.instance.materials.all().order_by("id")
-            payload = [
-                {
-                    "mat_partcode": m.mat_partcode,
-                    "mat_partname": m.mat_partname,
-                    "mat_maker": m.mat_maker,
-                    "unit": m.unit,
-                    "dim_qty": m.dim_qty,
-                    "loss_percent": m.loss_percent,
-                    "total": m.total,
-                }
-                for m in materials
-            ]
+            payload = list(
+                self.instance.materials.order_by("id").values(
+                    "mat_partcode",
+                    "mat_partname",
+                    "mat_maker",
+                    "unit",
+                    "dim_qty",
+                    "loss_percent",
+                    "total",
+                )
+            )
             self.fields["materials_json"].initial = json.dumps(payload, indent=2, ensure_ascii=False)
 
     def clean(self):
@@ -135,9 +194,7 @@ class TEPCodeAdminForm(forms.ModelForm):
         part_code = (cleaned.get("part_code") or "").strip()
 
         if customer and part_code:
-            parts = customer.parts or []
-            codes = {str(p.get("Partcode", "")).strip() for p in parts if isinstance(p, dict)}
-            if part_code not in codes:
+            if part_code not in customer.partcode_set:
                 raise ValidationError(
                     {"part_code": f"part_code '{part_code}' not found inside this customer's parts JSON."}
                 )
@@ -145,31 +202,23 @@ class TEPCodeAdminForm(forms.ModelForm):
         return cleaned
 
     def clean_materials_json(self):
-        raw = (self.cleaned_data.get("materials_json") or "").strip()
-        if raw == "":
-            return []
-
-        try:
-            data = json.loads(raw)
-        except json.JSONDecodeError as e:
-            raise ValidationError(f"Invalid JSON: {e}")
-
-        if not isinstance(data, list):
-            raise ValidationError("JSON must be an ARRAY (list) of materials.")
-
-        allowed_units = {"pc", "pcs", "m", "g", "kg"}
-        required = ["mat_partcode", "mat_partname", "mat_maker", "unit", "dim_qty", "total"]
+        data = _parse_json_array(
+            self.cleaned_data.get("materials_json"), "JSON must be an ARRAY (list) of materials."
+        )
 
+        errors = []
         for i, item in enumerate(data):
             if not isinstance(item, dict):
-                raise ValidationError(f"Item #{i+1} must be an object/dict.")
+                errors.append(f"Item #{i+1} must be an object/dict.")
+                continue
 
-            missing = [k for k in required if k not in item]
+            missing = [k for k in MATERIAL_REQUIRED_KEYS if k not in item]
             if missing:
-                raise ValidationError(f"Item #{i+1} missing keys: {', '.join(missing)}")
+                errors.append(f"Item #{i+1} missing keys: {', '.join(missing)}")
+                continue
 
-            if item["unit"] not in allowed_units:
-                raise ValidationError(f"Item #{i+1}: unit must be one of {sorted(allowed_units)}")
+            if item["unit"] not in MATERIAL_UNITS:
+                errors.append(f"Item #{i+1}: unit must be one of {sorted(MATERIAL_UNITS)}")
 
             if "loss_percent" not in item or item["loss_percent"] in (None, ""):
                 item["loss_percent"] = 10.0
@@ -179,7 +228,10 @@ class TEPCodeAdminForm(forms.ModelForm):
                 item["loss_percent"] = float(item["loss_percent"])
                 item["total"] = float(item["total"])
             except (TypeError, ValueError):
-                raise ValidationError(f"Item #{i+1}: dim_qty/loss_percent/total must be numeric.")
+                errors.append(f"Item #{i+1}: dim_qty/loss_percent/total must be numeric.")
+
+        if errors:
+            raise ValidationError(errors)
 
         return data
 
@@ -191,34 +243,73 @@ class TEPCodeAdmin(admin.ModelAdmin):
     list_display = ("tep_code", "customer", "part_code", "materials_count")
     search_fields = ("tep_code", "part_code", "customer__customer_name")
     list_filter = ("customer",)
+    list_select_related = ("customer",)
 
     fields = ("customer", "part_code", "tep_code", "materials_json")
     inlines = [MaterialInline]
 
     autocomplete_fields = ("customer",)
 
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if _on_changelist(self, request):
+            qs = qs.annotate(_materials_count=Count("materials"))
+        return qs
+
     def materials_count(self, obj: TEPCode):
-        return obj.materials.count()
+        return obj._materials_count
     materials_count.short_description = "Materials"
+    materials_count.admin_order_field = "_materials_count"
 
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
 
         materials_data = form.cleaned_data.get("materials_json", [])
 
-        Material.objects.filter(tep_code=obj).delete()
-
-        for item in materials_data:
-            Material.objects.create(
-                tep_code=obj,
-                mat_partcode=item["mat_partcode"],
-                mat_partname=item["mat_partname"],
-                mat_maker=item["mat_maker"],
-                unit=item["unit"],
-                dim_qty=item["dim_qty"],
-                loss_percent=item.get("loss_percent", 10.0),
-                total=item["total"],
-            )
+        with transaction.atomic():
+            # Sync by mat_partcode: keep matching rows, update only what changed.
+            existing = {}
+            stale_ids = []
+            for m in Material.objects.filter(tep_code=obj).order_by("id"):
+                if m.mat_partcode in existing:
+                    stale_ids.append(m.pk)
+                else:
+                    existing[m.mat_partcode] = m
+
+            to_create = []
+            to_update = []
+            for item in materials_data:
+                values = {
+                    "mat_partname": item["mat_partname"],
+                    "mat_maker": item["mat_maker"],
+                    "unit": item["unit"],
+                    "dim_qty": item["dim_qty"],
+                    "loss_percent": item.get("loss_percent", 10.0),
+                    "total": item["total"],
+                }
+
+                m = existing.pop(item["mat_partcode"], None)
+                if m is None:
+                    to_create.append(Material(tep_code=obj, mat_partcode=item["mat_partcode"], **values))
+                    continue
+
+                changed = False
+                for field, value in values.items():
+                    if getattr(m, field) != value:
+                        setattr(m, field, value)
+                        changed = True
+                if changed:
+                    to_update.append(m)
+
+            stale_ids.extend(m.pk for m in existing.values())
+
+            if stale_ids:
+                Material.objects.filter(pk__in=stale_ids).delete()
+                drop_dashboard_counts(Material)
+            if to_update:
+                Material.objects.bulk_update(to_update, MATERIAL_SYNC_FIELDS, batch_size=500)
+            if to_create:
+                Material.objects.bulk_create(to_create, batch_size=500)
 
 @admin.register(Material)
 class MaterialAdmin(admin.ModelAdmin):
@@ -243,6 +334,7 @@ class MaterialAdmin(admin.ModelAdmin):
         "tep_code__customer__customer_name",
     )
     list_filter = ("unit", "tep_code__customer")
+    list_select_related = ("tep_code", "tep_code__customer")
     autocomplete_fields = ("tep_code",)
 
     def part_code(self, obj: Material):
@@ -260,27 +352,26 @@ class MaterialListAdmin(admin.ModelAdmin):
     list_filter = ("mat_maker",)
 
 
+_DATE_HEAD_RE = re.compile(r"[^-/]*")
+
+
 def _date_to_month_name(val):
     """Convert date string (Jan-2026, JAN, 1, January) to full month name."""
     if not val:
         return ""
-    s = str(val).strip()
-    months = [
-        "January", "February", "March", "April", "May", "June",
-        "July", "August", "September", "October", "November", "December"
-    ]
-    abbr = ["jan", "feb", "mar", "apr", "may", "jun",
-            "jul", "aug", "sep", "oct", "nov", "dec"]
-    s_lower = s.lower()
-    for i, m in enumerate(abbr):
-        if s_lower.startswith(m) or s_lower == m:
-            return months[i]
-    try:
-        n = int(s.split("-")[0] if "-" in s else s.split("/")[0] if "/" in s else s)
+    return _month_name_from_str(str(val).strip())
+
+
+@lru_cache(maxsize=1024)
+def _month_name_from_str(s):
+    name = ABBR_TO_MONTH.get(s[:3].lower())
+    if name:
+        return name
+    head = _DATE_HEAD_RE.match(s).group().strip()
+    if head.isdecimal():
+        n = int(head)
         if 1 <= n <= 12:
-            return months[n - 1]
-    except (ValueError, IndexError):
-        pass
+            return MONTH_NAMES[n - 1]
     return s
 
 
@@ -301,17 +392,13 @@ class ForecastAdmin(admin.ModelAdmin):
     list_select_related = ("customer",)
 
     def months_display(self, obj):
-        items = obj.monthly_forecasts or []
-        names = []
-        seen = set()
-        for m in items:
-            if isinstance(m, dict):
-                d = m.get("date", "")
-                name = _date_to_month_name(d)
-                if name and name not in seen:
-                    seen.add(name)
-                    names.append(name)
-        return ", ".join(names) if names else "—"
+        names = dict.fromkeys(
+            _date_to_month_name(m.get("date"))
+            for m in (obj.monthly_forecasts or [])
+            if isinstance(m, dict)
+        )
+        names.pop("", None)
+        return ", ".join(names) or "—"
     months_display.short_description = "Months"
 
     def unit_price_display(self, obj):
@@ -1,81 +1,103 @@
 from ninja import NinjaAPI, File
 from ninja.files import UploadedFile
-from django.http import JsonResponse
-from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.core.cache import cache
+from django.conf import settings
+from django.db import IntegrityError, InterfaceError, OperationalError, connection, transaction
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
-from django.db.models import Prefetch
-import csv, io, re
+from django.utils import timezone
+from django.utils.http import parse_etags
+from django.db.models import Count, Max, Q
+from django.db.models.expressions import RawSQL
+import csv, hashlib, io, re
+from functools import lru_cache
 from .models import Customer, TEPCode, Material, CustomerCSV, MaterialList, Forecast
+from .signals import drop_dashboard_counts
 #new, naglagay nung MaterialList sa itaas na import
-from .schemas import (CustomerIn, CustomerOut, CustomerFullOut, TEPCodeIn, TEPCodeOut, MaterialIn, MaterialOut, MaterialListIn, ForecastIn, ForecastBatchIn, ForecastBatchPartIn)
+from .schemas import (CustomerIn, CustomerOut, CustomerFullOut, TEPCodeIn, TEPCodeOut, MaterialIn, MaterialOut, MaterialListIn, MaterialListBulkIn, ForecastIn, ForecastBatchIn, ForecastBatchPartIn)
 
 
 api = NinjaAPI(title="Sales API")
 
+ALLOWED_UNITS = frozenset(code for code, _ in MaterialList.UNIT_CHOICES)
+
 def jresponse(data, status=200):
     return JsonResponse(data, status=status, safe=False)
 
-import re
-
-def _normalize_space(s):
-    return re.sub(r"\s+", " ", (s or "").strip())
+@lru_cache(maxsize=1024)
+def _material_name_re(base):
+    """Matches `base` or `base N` (case-insensitive), capturing N."""
+    return re.compile(rf"^{re.escape(base)}(?: (\d+))?$", re.IGNORECASE)
 
-def _unique_partname_for_customer(customer, base_name, part_code):
+def _customer_by_partcode(part_code):
     """
-    Unique Partname per customer.parts.
-    If base_name already exists for a different Partcode, returns base_name 1, base_name 2, ...
+    First customer (by id) whose parts JSON has an entry whose trimmed
+    Partcode equals part_code; numeric Partcodes compare by their text. The
+    match runs in the database: jsonb_array_elements() on PostgreSQL,
+    json_each() on SQLite.
     """
-    base_name = _normalize_space(base_name)
-    part_code = _normalize_space(part_code)
+    qs = Customer.objects.order_by("id")
+    table = Customer._meta.db_table
+
+    if connection.vendor == "postgresql":
+        return qs.filter(
+            pk__in=RawSQL(
+                f'SELECT c.id FROM "{table}" c, jsonb_array_elements('
+                "CASE WHEN jsonb_typeof(c.parts) = 'array' THEN c.parts ELSE '[]'::jsonb END"
+                ") p WHERE btrim(p ->> 'Partcode') = %s",
+                (part_code,),
+            )
+        ).first()
+
+    if connection.vendor == "sqlite":
+        return qs.filter(
+            pk__in=RawSQL(
+                f'SELECT c.id FROM "{table}" c, json_each(c.parts) p '
+                "WHERE trim(json_extract(c.parts, p.fullkey || '.Partcode')) = %s",
+                (part_code,),
+            )
+        ).first()
 
-    parts = customer.parts or []
+    for c in qs:
+        if any(
+            isinstance(p, dict) and str(p.get("Partcode", "")).strip() == part_code
+            for p in (c.parts or [])
+        ):
+            return c
+    return None
 
-    for p in parts:
-        if isinstance(p, dict) and _normalize_space(p.get("Partcode")) == part_code:
-            existing = _normalize_space(p.get("Partname"))
-            return existing or base_name
-        
-    existing_names = set()
-    for p in parts:
-        if isinstance(p, dict):
-            n = _normalize_space(p.get("Partname"))
-            if n:
-                existing_names.add(n.lower())
-
-    if base_name.lower() not in existing_names:
-        return base_name
-
-    i = 1
-    while True:
-        candidate = f"{base_name} {i}"
-        if candidate.lower() not in existing_names:
-            return candidate
-        i += 1
-
-def _ensure_customer_part_entry(customer, part_code, part_name):
+def _pick_material_name(base, siblings, exclude_partcode=""):
     """
-    Ensures customer.parts contains Partcode.
-    If not exists, adds it with unique Partname (Tape, Tape 1, Tape 2...).
-    Returns (changed: bool, used_partname: str)
+    In-memory core of _allocate_material_name.
+    `siblings` are the TEP's Material rows ordered by id. Returns
+    (name for the new row, sibling that must be renamed to "base 1" or None).
     """
-    part_code = _normalize_space(part_code)
-    part_name = _normalize_space(part_name) or part_code
+    base_lower = base.lower()
+    siblings = [
+        m for m in siblings
+        if (m.mat_partname or "").lower().startswith(base_lower)
+        and not (exclude_partcode and m.mat_partcode == exclude_partcode)
+    ]
 
-    parts = customer.parts or []
+    name_re = _material_name_re(base)
+    matches = [
+        m for m in (name_re.match((s.mat_partname or "").strip()) for s in siblings)
+        if m
+    ]
 
-    for p in parts:
-        if isinstance(p, dict) and _normalize_space(p.get("Partcode")) == part_code:
-            used = _normalize_space(p.get("Partname")) or part_name
-            return False, used
+    if not matches:
+        return base, None
 
-    unique_name = _unique_partname_for_customer(customer, part_name, part_code)
+    numbers = [int(m.group(1)) for m in matches if m.group(1)]
 
-    parts.append({"Partcode": part_code, "Partname": unique_name})
-    customer.parts = parts
-    customer.save()
+    if not numbers:
+        first = next(
+            (s for s in siblings if (s.mat_partname or "").lower() == base_lower),
+            None
+        )
+        return f"{base} 2", first
 
-    return True, unique_name
+    return f"{base} {max(numbers) + 1}", None
 
 def _allocate_material_name(tep, base_name: str, exclude_partcode: str = "") -> str:
     """
@@ -90,44 +112,32 @@ def _allocate_material_name(tep, base_name: str, exclude_partcode: str = "") ->
 
     exclude_partcode = (exclude_partcode or "").strip()
 
+    # Cheap prefix filter in the DB; the exact pattern is checked in Python.
     qs = Material.objects.filter(
         tep_code=tep,
-        mat_partname__iregex=rf"^{re.escape(base)}( \d+)?$"
-    )
-    if exclude_partcode:
-        qs = qs.exclude(mat_partcode=exclude_partcode)
-
-    existing_names = list(qs.values_list("mat_partname", flat=True))
+        mat_partname__istartswith=base
+    ).only("id", "mat_partcode", "mat_partname").order_by("id")
 
-    if not existing_names:
-        return base
+    name, rename = _pick_material_name(base, list(qs), exclude_partcode)
 
-    numbers = []
-    for n in existing_names:
-        m = re.match(
-            rf"^{re.escape(base)}(?: (\d+))?$",
-            (n or "").strip(),
-            flags=re.IGNORECASE
-        )
-        if m and m.group(1):
-            numbers.append(int(m.group(1)))
+    if rename is not None:
+        rename.mat_partname = f"{base} 1"
+        rename.save(update_fields=["mat_partname"])
 
-    if not numbers:
-        existing_base = Material.objects.filter(
-            tep_code=tep,
-            mat_partname__iexact=base,
-        )
-        if exclude_partcode:
-            existing_base = existing_base.exclude(mat_partcode=exclude_partcode)
+    return name
 
-        first = existing_base.order_by("id").first()
-        if first:
-            first.mat_partname = f"{base} 1"
-            first.save(update_fields=["mat_partname"])
+MATERIAL_OUT_FIELDS = ("mat_partcode", "mat_partname", "mat_maker", "unit", "dim_qty", "loss_percent", "total")
 
-        return f"{base} 2"
-
-    return f"{base} {max(numbers) + 1}"
+def _materials_by_tep(tep_ids, *ordering):
+    """
+    Material rows for the given TEP ids as plain dicts, grouped by tep_code_id.
+    One query, no model instances.
+    """
+    grouped = {}
+    qs = Material.objects.filter(tep_code_id__in=tep_ids).order_by(*ordering)
+    for row in qs.values("tep_code_id", *MATERIAL_OUT_FIELDS):
+        grouped.setdefault(row.pop("tep_code_id"), []).append(row)
+    return grouped
 
 @api.get("/customers", tags=["CUSTOMER"])
 def customers_tree(request, q: str = ""):
@@ -151,7 +161,7 @@ def customers_tree(request, q: str = ""):
     """
     qs = (
         Customer.objects
-        .prefetch_related("tep_codes__materials")
+        .prefetch_related("tep_codes")
         .order_by("customer_name")
     )
 
@@ -165,12 +175,21 @@ def customers_tree(request, q: str = ""):
             | Q(tep_codes__materials__mat_maker__icontains=q)
         ).distinct()
 
+    customers = list(qs)
+    mats_by_tep = _materials_by_tep(
+        [t.id for cust in customers for t in cust.tep_codes.all()], "id"
+    )
+
     out = []
 
-    for cust in qs:
+    for cust in customers:
         parts = cust.parts or []
         customer_parts = []
 
+        teps_by_part = {}
+        for t in cust.tep_codes.all():
+            teps_by_part.setdefault(t.part_code, []).append(t)
+
         for p in parts:
             if not isinstance(p, dict):
                 continue
@@ -181,24 +200,10 @@ def customers_tree(request, q: str = ""):
                 continue
 
             tep_list = []
-            tep_objs = [t for t in cust.tep_codes.all() if t.part_code == partcode]
-
-            for tep in tep_objs:
-                mats = []
-                for m in tep.materials.all():
-                    mats.append({
-                        "mat_partcode": m.mat_partcode,
-                        "mat_partname": m.mat_partname,
-                        "mat_maker": m.mat_maker,
-                        "unit": m.unit,
-                        "dim_qty": m.dim_qty,
-                        "loss_percent": m.loss_percent,
-                        "total": m.total,
-                    })
-
+            for tep in teps_by_part.get(partcode, []):
                 tep_list.append({
                     "TEP Code": tep.tep_code,
-                    "Materials": mats
+                    "Materials": mats_by_tep.get(tep.id, [])
                 })
 
             customer_parts.append({
@@ -246,11 +251,16 @@ def delete_customer(request, customer_id: int):
 
 @api.get("/customers/{customer_id}/tep-codes", response=list[TEPCodeOut], tags=["TEP"])
 def list_tep_codes(request, customer_id: int, part_code: str = ""):
-    customer = get_object_or_404(Customer, id=customer_id)
-    qs = customer.tep_codes.all().order_by("tep_code")
+    get_object_or_404(Customer.objects.values_list("id", flat=True), id=customer_id)
+    qs = TEPCode.objects.filter(customer_id=customer_id).order_by("tep_code")
     if part_code:
         qs = qs.filter(part_code=part_code)
-    return qs
+
+    teps = list(qs.values("id", "part_code", "tep_code"))
+    mats_by_tep = _materials_by_tep([t["id"] for t in teps], "id")
+    for t in teps:
+        t["materials"] = mats_by_tep.get(t.pop("id"), [])
+    return teps
 
 
 @api.post("/parts/{part_code}/tep-codes", response=TEPCodeOut, tags=["TEP"])
@@ -263,15 +273,7 @@ def create_tep_code_by_part_code(request, part_code: str, payload: TEPCodeIn):
     if not tep_code:
         return jresponse({"error": "tep_code is required"}, status=400)
 
-    customer = None
-    for c in Customer.objects.all():
-        parts = c.parts or []
-        if any(
-            isinstance(p, dict) and str(p.get("Partcode", "")).strip() == part_code
-            for p in parts
-        ):
-            customer = c
-            break
+    customer = _customer_by_partcode(part_code)
 
     if not customer:
         return jresponse({"error": f"part_code '{part_code}' not found in any customer.parts"}, status=404)
@@ -295,6 +297,8 @@ def delete_tep_code_by_code(request, tep_code: str):
 
     deleted_count, _ = TEPCode.objects.filter(tep_code=tep_code).delete()
 
+    drop_dashboard_counts(TEPCode, Material)
+
     if deleted_count == 0:
         return jresponse(
             {"error": f"TEP code '{tep_code}' not found"},
@@ -313,9 +317,13 @@ def list_materials_by_tep_code(request, tep_code: str):
     if not tep_code:
         return jresponse({"error": "tep_code is required"}, status=400)
 
-    tep = get_object_or_404(TEPCode, tep_code=tep_code)
+    tep_id = get_object_or_404(TEPCode.objects.values_list("id", flat=True), tep_code=tep_code)
 
-    return tep.materials.all().order_by("mat_partname")
+    return list(
+        Material.objects.filter(tep_code_id=tep_id)
+        .order_by("mat_partname")
+        .values(*MATERIAL_OUT_FIELDS)
+    )
 
 
 
@@ -395,10 +403,14 @@ def update_material_by_tep_and_partcode(
     request,
     tep_code: str,
     mat_partcode: str,
-    payload: MaterialIn
+    payload: MaterialIn,
+    part_code: str = "",
+    customer_name: str = "",
 ):
     tep_code = (tep_code or "").strip()
     mat_partcode = (mat_partcode or "").strip()
+    part_code = (part_code or "").strip()
+    customer_name = (customer_name or "").strip()
 
     if not tep_code:
         return jresponse({"error": "tep_code is required"}, status=400)
@@ -406,23 +418,71 @@ def update_material_by_tep_and_partcode(
     if not mat_partcode:
         return jresponse({"error": "mat_partcode is required"}, status=400)
 
-    material = get_object_or_404(
-        Material,
-        tep_code__tep_code=tep_code,
-        mat_partcode=mat_partcode
-    )
+    # tep_code is not unique, so narrow it the same way the create endpoint
+    # does and refuse to guess between materials on several TEP codes.
+    qs = Material.objects.filter(tep_code__tep_code=tep_code, mat_partcode=mat_partcode)
+    if part_code:
+        qs = qs.filter(tep_code__part_code=part_code)
+    if customer_name:
+        qs = qs.filter(tep_code__customer__customer_name=customer_name)
+    rows = list(qs.order_by("id").values_list("id", "tep_code_id")[:2])
+    if not rows:
+        return jresponse(
+            {
+                "error": f"No material found for tep_code '{tep_code}' "
+                         f"and mat_partcode '{mat_partcode}'"
+            },
+            status=404
+        )
+    if len(rows) > 1 and rows[0][1] != rows[1][1]:
+        return jresponse(
+            {"error": "Several TEP codes match. Provide part_code and/or customer_name."},
+            status=409,
+        )
+    material_id, tep_id = rows[0]
 
-    material.mat_partcode = payload.mat_partcode
-    material.mat_partname = payload.mat_partname
-    material.mat_maker = payload.mat_maker
-    material.unit = payload.unit
-    material.dim_qty = payload.dim_qty
-    material.loss_percent = payload.loss_percent
-    material.total = payload.total
+    new_partcode = (payload.mat_partcode or "").strip() or mat_partcode
+    loss = payload.loss_percent if payload.loss_percent is not None else 10.0
+    total = round(float(payload.dim_qty) * (1 + (float(loss) / 100.0)), 4)
 
-    material.save()
+    fields = {
+        "dim_qty": payload.dim_qty,
+        "loss_percent": loss,
+        "total": total,
+    }
 
-    return material
+    with transaction.atomic():
+        if new_partcode != mat_partcode:
+            master = (
+                MaterialList.objects
+                .filter(mat_partcode=new_partcode)
+                .only("mat_partname", "mat_maker", "unit")
+                .first()
+            )
+            if not master:
+                return jresponse(
+                    {"error": f"mat_partcode '{new_partcode}' not found in master list."},
+                    status=404,
+                )
+            if Material.objects.filter(tep_code_id=tep_id, mat_partcode=new_partcode).exists():
+                return jresponse({"error": "Material already exists for this TEP + mat_partcode."}, status=409)
+
+            # A new code means a different master material: take its name,
+            # maker and unit, naming it like create_material_by_tep_code.
+            fields.update(
+                mat_partcode=new_partcode,
+                mat_partname=_allocate_material_name(
+                    tep=tep_id,
+                    base_name=master.mat_partname,
+                    exclude_partcode=mat_partcode,
+                ),
+                mat_maker=master.mat_maker,
+                unit=master.unit,
+            )
+
+        Material.objects.filter(pk=material_id).update(**fields)
+
+    return Material.objects.filter(pk=material_id).values(*MATERIAL_OUT_FIELDS).get()
 
 
 
@@ -441,6 +501,7 @@ def delete_material_by_tep_and_partcode(request, tep_code: str, mat_partcode: st
         tep_code__tep_code=tep_code,
         mat_partcode=mat_partcode
     ).delete()
+    drop_dashboard_counts(Material)
 
     if deleted_count == 0:
         return jresponse(
@@ -467,35 +528,25 @@ def upload_csv(request, file: UploadedFile = File(...)):
         return jresponse({"error": "No file uploaded."}, status=400)
 
     try:
-        content = file.read().decode("utf-8", errors="ignore")
-        csv_file = io.StringIO(content)
-        reader = csv.DictReader(csv_file)
-
-        reader.fieldnames = [h.strip().lstrip("\ufeff") for h in (reader.fieldnames or [])]
-
         inserted = 0
         updated = 0
         master_inserted = 0
         master_updated = 0
 
-        ALLOWED_UNITS = {"pc", "pcs", "m", "g", "kg"}
-
+        # Rows are stripped once when read, so these helpers only need plain lookups.
         def fnum(x, default=0.0):
             try:
-                if x is None:
-                    return float(default)
-                s = str(x).strip()
-                if s == "":
+                if not x:
                     return float(default)
-                return float(s)
+                return float(x)
             except Exception:
                 return float(default)
 
         def sget(row, *keys, default=""):
             for k in keys:
                 v = row.get(k)
-                if v is not None and str(v).strip() != "":
-                    return str(v).strip()
+                if v:
+                    return v
             return default
 
         with transaction.atomic():
@@ -504,28 +555,136 @@ def upload_csv(request, file: UploadedFile = File(...)):
             except Exception:
                 pass
 
-            for row in reader:
-                mat_partcode = sget(row, "mat_partcode", "material_part_code")
-                mat_partname = sget(row, "mat_partname", "material_name")
-                mat_maker = sget(row, "mat_maker", "maker")
-                unit = sget(row, "unit", default="pc").lower()
+            # Read the upload straight from its file handle instead of holding
+            # the whole payload in memory as bytes and again as str. Saving
+            # CustomerCSV above moves the handle, so rewind first.
+            file.seek(0)
+            csv_file = io.TextIOWrapper(file.file, encoding="utf-8", errors="ignore", newline="")
+            reader = csv.DictReader(csv_file)
 
-                if unit not in ALLOWED_UNITS:
-                    unit = "pc"
+            reader.fieldnames = [h.strip().lstrip("\ufeff") for h in (reader.fieldnames or [])]
+
+            records = []
+            for raw_row in reader:
+                row = {k: (v.strip() if isinstance(v, str) else v) for k, v in raw_row.items()}
 
+                mat_partcode = sget(row, "mat_partcode", "material_part_code")
                 if not mat_partcode:
                     continue
 
-                master, created_master = MaterialList.objects.get_or_create(
-                    mat_partcode=mat_partcode,
-                    defaults={
-                        "mat_partname": mat_partname or mat_partcode,
-                        "mat_maker": mat_maker or "Unknown",
-                        "unit": unit,
-                    }
+                unit = sget(row, "unit", default="pc")
+                if unit not in ALLOWED_UNITS:
+                    unit = unit.lower()
+                    if unit not in ALLOWED_UNITS:
+                        unit = "pc"
+
+                records.append({
+                    "mat_partcode": mat_partcode,
+                    "mat_partname": sget(row, "mat_partname", "material_name"),
+                    "mat_maker": sget(row, "mat_maker", "maker"),
+                    "unit": unit,
+                    "customer_name": sget(row, "customer_name"),
+                    "partcode": sget(row, "Partcode", "part_code"),
+                    "partname": sget(row, "Partname", "part_name"),
+                    "tep_code": sget(row, "tep_code"),
+                    "dim_qty": row.get("dim_qty"),
+                    "loss_percent": row.get("loss_percent"),
+                    "total": row.get("total"),
+                })
+
+            # Hand the handle back to the upload so it is not closed with the wrapper.
+            csv_file.detach()
+
+            # One query per table up front instead of several per row.
+            masters = {
+                m.mat_partcode: m
+                for m in MaterialList.objects.filter(
+                    mat_partcode__in={r["mat_partcode"] for r in records}
+                )
+            }
+            customers = {
+                c.customer_name: c
+                for c in Customer.objects.filter(
+                    customer_name__in={r["customer_name"] for r in records if r["customer_name"]}
+                )
+            }
+
+            # Rows that reach a TEP need their Customer and TEPCode to exist.
+            # Insert the missing ones in one statement per table, then re-select
+            # for their ids (ignore_conflicts does not return primary keys).
+            linked = [
+                r for r in records
+                if r["customer_name"] and r["partcode"] and r["partname"] and r["tep_code"]
+            ]
+
+            missing_names = list(dict.fromkeys(
+                r["customer_name"] for r in linked if r["customer_name"] not in customers
+            ))
+            if missing_names:
+                Customer.objects.bulk_create(
+                    [Customer(customer_name=n) for n in missing_names],
+                    ignore_conflicts=True,
+                )
+                customers.update(
+                    (c.customer_name, c)
+                    for c in Customer.objects.filter(customer_name__in=missing_names)
                 )
 
-                if created_master:
+            def load_teps():
+                return {
+                    (t.customer_id, t.part_code, t.tep_code): t
+                    for t in TEPCode.objects.filter(
+                        customer__in=list(customers.values()),
+                        tep_code__in={r["tep_code"] for r in linked},
+                    )
+                }
+
+            teps = load_teps()
+            missing_teps = list(dict.fromkeys(
+                key for key in (
+                    (customers[r["customer_name"]].pk, r["partcode"], r["tep_code"])
+                    for r in linked
+                )
+                if key not in teps
+            ))
+            if missing_teps:
+                TEPCode.objects.bulk_create(
+                    [
+                        TEPCode(customer_id=cid, part_code=pc, tep_code=tc)
+                        for cid, pc, tc in missing_teps
+                    ],
+                    ignore_conflicts=True,
+                )
+                teps = load_teps()
+
+            materials = {}
+            siblings_by_tep = {}
+            for m in Material.objects.filter(tep_code__in=list(teps.values())).order_by("id"):
+                materials.setdefault((m.tep_code_id, m.mat_partcode), m)
+                siblings_by_tep.setdefault(m.tep_code_id, []).append(m)
+
+            new_masters = []
+            dirty_masters = {}
+            dirty_customers = {}
+            dirty_materials = {}
+            new_materials = []
+
+            for r in records:
+                mat_partcode = r["mat_partcode"]
+                mat_partname = r["mat_partname"]
+                mat_maker = r["mat_maker"]
+                unit = r["unit"]
+
+                master = masters.get(mat_partcode)
+                if master is None:
+                    master = MaterialList(
+                        mat_partcode=mat_partcode,
+                        mat_partname=mat_partname or mat_partcode,
+                        mat_maker=mat_maker or "Unknown",
+                        unit=unit,
+                    )
+                    masters[mat_partcode] = master
+                    new_masters.append(master)
                     master_inserted += 1
                 else:
                     changed = False
@@ -539,19 +698,20 @@ def upload_csv(request, file: UploadedFile = File(...)):
                         master.unit = unit
                         changed = True
                     if changed:
-                        master.save()
+                        if master.pk:
+                            dirty_masters[master.pk] = master
                         master_updated += 1
 
-                customer_name = sget(row, "customer_name")
-                partcode = sget(row, "Partcode", "part_code")
-                partname = sget(row, "Partname", "part_name")
-                tep_code = sget(row, "tep_code")
+                customer_name = r["customer_name"]
+                partcode = r["partcode"]
+                partname = r["partname"]
+                tep_code = r["tep_code"]
 
-                dim_qty = fnum(row.get("dim_qty"), 0.0)
-                loss_percent = fnum(row.get("loss_percent"), 10.0)
+                dim_qty = fnum(r["dim_qty"], 0.0)
+                loss_percent = fnum(r["loss_percent"], 10.0)
 
-                total_csv = row.get("total")
-                if total_csv is None or str(total_csv).strip() == "":
+                total_csv = r["total"]
+                if not total_csv:
                     total = round(float(dim_qty) * (1 + (float(loss_percent) / 100.0)), 4)
                 else:
                     total = round(fnum(total_csv, 0.0), 4)
@@ -559,7 +719,7 @@ def upload_csv(request, file: UploadedFile = File(...)):
                 if not (customer_name and partcode and partname and tep_code):
                     continue
 
-                customer, _ = Customer.objects.get_or_create(customer_name=customer_name)
+                customer = customers[customer_name]
 
                 parts = customer.parts or []
                 exists = any(
@@ -569,58 +729,76 @@ def upload_csv(request, file: UploadedFile = File(...)):
                 if not exists:
                     parts.append({"Partcode": partcode, "Partname": partname})
                     customer.parts = parts
-                    customer.save()
+                    dirty_customers[customer.pk] = customer
 
-                tep, _ = TEPCode.objects.get_or_create(
-                    customer=customer,
-                    part_code=partcode,
-                    tep_code=tep_code,
-                )
+                tep = teps[(customer.pk, partcode, tep_code)]
 
-                with transaction.atomic():
-                    existing_mat = Material.objects.filter(
-                        tep_code=tep,
-                        mat_partcode=master.mat_partcode
-                    ).first()
-
-                    if existing_mat:
-                        if dim_qty != 0:
-                            existing_mat.dim_qty = dim_qty
-                        if loss_percent != 0:
-                            existing_mat.loss_percent = loss_percent
-
-                        if total_csv is None or str(total_csv).strip() == "":
-                            existing_mat.total = round(
-                                float(existing_mat.dim_qty) * (1 + (float(existing_mat.loss_percent) / 100.0)),
-                                4
-                            )
-                        else:
-                            existing_mat.total = total
-
-                        existing_mat.mat_maker = master.mat_maker
-                        existing_mat.unit = master.unit
-                        existing_mat.save()
-
-                        updated += 1
-                        continue
-
-                    final_name = _allocate_material_name(
-                        tep=tep,
-                        base_name=master.mat_partname,
-                        exclude_partcode=master.mat_partcode
-                    )
+                existing_mat = materials.get((tep.pk, master.mat_partcode))
 
-                    Material.objects.create(
-                        tep_code=tep,
-                        mat_partcode=master.mat_partcode,
-                        mat_partname=final_name,
-                        mat_maker=master.mat_maker,
-                        unit=master.unit,
-                        dim_qty=dim_qty,
-                        loss_percent=loss_percent,
-                        total=total,
-                    )
-                    inserted += 1
+                if existing_mat:
+                    if dim_qty != 0:
+                        existing_mat.dim_qty = dim_qty
+                    if loss_percent != 0:
+                        existing_mat.loss_percent = loss_percent
+
+                    if not total_csv:
+                        existing_mat.total = round(
+                            float(existing_mat.dim_qty) * (1 + (float(existing_mat.loss_percent) / 100.0)),
+                            4
+                        )
+                    else:
+                        existing_mat.total = total
+
+                    existing_mat.mat_maker = master.mat_maker
+                    existing_mat.unit = master.unit
+                    if existing_mat.pk:
+                        dirty_materials[existing_mat.pk] = existing_mat
+
+                    updated += 1
+                    continue
+
+                # Same naming rules as _allocate_material_name, but against
+                # the rows already loaded for this TEP.
+                base = (master.mat_partname or "").strip() or "UNKNOWN"
+                siblings = siblings_by_tep.setdefault(tep.pk, [])
+                final_name, rename = _pick_material_name(base, siblings, master.mat_partcode)
+                if rename is not None:
+                    rename.mat_partname = f"{base} 1"
+                    if rename.pk:
+                        dirty_materials[rename.pk] = rename
+
+                material = Material(
+                    tep_code=tep,
+                    mat_partcode=master.mat_partcode,
+                    mat_partname=final_name,
+                    mat_maker=master.mat_maker,
+                    unit=master.unit,
+                    dim_qty=dim_qty,
+                    loss_percent=loss_percent,
+                    total=total,
+                )
+                materials[(tep.pk, master.mat_partcode)] = material
+                siblings.append(material)
+                new_materials.append(material)
+                inserted += 1
+
+            MaterialList.objects.bulk_create(new_masters, batch_size=1000)
+            # bulk_update skips auto_now, so stamp the rows explicitly.
+            now = timezone.now()
+            for master in dirty_masters.values():
+                master.updated_at = now
+            MaterialList.objects.bulk_update(
+                list(dirty_masters.values()),
+                ["mat_partname", "mat_maker", "unit", "updated_at"],
+                batch_size=1000,
+            )
+            Customer.objects.bulk_update(list(dirty_customers.values()), ["parts"], batch_size=1000)
+            Material.objects.bulk_update(
+                list(dirty_materials.values()),
+                ["mat_partname", "dim_qty", "loss_percent", "total", "mat_maker", "unit"],
+                batch_size=1000,
+            )
+            Material.objects.bulk_create(new_materials, batch_size=1000)
 
         return jresponse(
             {
@@ -640,14 +818,12 @@ def upload_csv(request, file: UploadedFile = File(...)):
 #new code for the output    
 @api.get("/output-format", tags=["GET DETAILS"])
 def output_format(request):
-    customers = Customer.objects.prefetch_related(
-        Prefetch(
-            "tep_codes",
-            queryset=TEPCode.objects.prefetch_related(
-                Prefetch("materials", queryset=Material.objects.all().order_by("mat_partname"))
-            ).all()
-        )
-    ).all().order_by("customer_name")
+    customers = list(
+        Customer.objects.prefetch_related("tep_codes").all().order_by("customer_name")
+    )
+    mats_by_tep = _materials_by_tep(
+        [t.id for c in customers for t in c.tep_codes.all()], "mat_partname"
+    )
 
     result = []
 
@@ -669,20 +845,9 @@ def output_format(request):
 
             tep_codes_out = []
             for tep in teps_by_part.get(partcode, []):
-                mats_out = []
-                for m in tep.materials.all():
-                    mats_out.append({
-                        "mat_partcode": m.mat_partcode,
-                        "mat_partname": m.mat_partname,
-                        "mat_maker": m.mat_maker,
-                        "unit": m.unit,
-                        "dim_qty": m.dim_qty,
-                        "loss_percent": m.loss_percent,
-                        "total": m.total,
-                    })
                 tep_codes_out.append({
                     "TEP Code": tep.tep_code,
-                    "Materials": mats_out
+                    "Materials": mats_by_tep.get(tep.id, [])
                 })
             parts_out.append({
                 "Partcode": partcode,
@@ -696,6 +861,15 @@ def output_format(request):
     return jresponse(result)
 
 
+_MONTH_INDEX = {
+    name[:3]: i
+    for i, name in enumerate(
+        ("january", "february", "march", "april", "may", "june",
+         "july", "august", "september", "october", "november", "december"),
+        start=1,
+    )
+}
+
 def _month_index_from_string(val: str) -> int | None:
     """
     Convert various month representations (Jan-2026, JAN, January, 1, 01/2026) to 1-12.
@@ -707,31 +881,17 @@ def _month_index_from_string(val: str) -> int | None:
     if not s:
         return None
 
-    months = [
-        "january", "february", "march", "april", "may", "june",
-        "july", "august", "september", "october", "november", "december",
-    ]
-    abbr = ["jan", "feb", "mar", "apr", "may", "jun",
-            "jul", "aug", "sep", "oct", "nov", "dec"]
-
-    lower = s.lower()
-    for i, a in enumerate(abbr):
-        if lower.startswith(a) or lower == a:
-            return i + 1
-
-    # Try full month names
-    for i, name in enumerate(months):
-        if lower.startswith(name) or lower == name:
-            return i + 1
+    # Month names and abbreviations all start with the 3-letter abbreviation.
+    idx = _MONTH_INDEX.get(s[:3].lower())
+    if idx:
+        return idx
 
-    # Try numeric forms (1, 01, 1-2026, 01/2026, etc.)
-    try:
-        head = s.split("-")[0] if "-" in s else s.split("/")[0] if "/" in s else s
+    # Numeric forms (1, 01, 1-2026, 01/2026, etc.)
+    head = (s.split("-", 1)[0] if "-" in s else s.split("/", 1)[0]).strip()
+    if head.isdecimal():
         n = int(head)
         if 1 <= n <= 12:
             return n
-    except (ValueError, IndexError):
-        return None
 
     return None
 
@@ -760,6 +920,13 @@ def _forecast_to_output(forecast):
         }
     }
 
+def _monthly_payload(rows):
+    """MonthlyForecastIn rows as the dicts stored in Forecast.monthly_forecasts."""
+    return [
+        {"date": m.date, "unit_price": float(m.unit_price), "quantity": float(m.quantity)}
+        for m in (rows or [])
+    ]
+
 @api.post("/forecasts", tags=["FORECAST"])
 def create_forecast(request, payload: ForecastBatchIn):
     """
@@ -803,13 +970,7 @@ def create_forecast(request, payload: ForecastBatchIn):
         if not part_number or not part_name:
             return jresponse({"error": "Each part must have part_number and part_name"}, status=400)
 
-        monthly = []
-        for m in (part.monthly_forecasts or []):
-            monthly.append({
-                "date": m.date,
-                "unit_price": float(m.unit_price),
-                "quantity": float(m.quantity),
-            })
+        monthly = _monthly_payload(part.monthly_forecasts)
 
         # Create the forecast (allow duplicates)
         forecast = Forecast.objects.create(
@@ -860,44 +1021,116 @@ def get_forecasts_by_customer(
 
     Optionally provide from_month and to_month (e.g. January, Feb, 1, 3)
     to compute total amount for the selected month range per forecast.
+
+    With CACHE_FALLBACK_ENABLED, the last good response for the same request is
+    served (marked X-Cache: STALE) when the database cannot be reached.
     """
     customer_name = (customer_name or "").strip()
     if not customer_name:
         return jresponse({"error": "customer_name is required"}, status=400)
 
-    customer = Customer.objects.filter(customer_name__iexact=customer_name).first()
-    if not customer:
-        return jresponse({"error": f"Customer '{customer_name}' not found"}, status=404)
+    fallback = getattr(settings, "CACHE_FALLBACK_ENABLED", False)
+    # Hashed name plus parsed month indices: a valid cache key whatever the
+    # input, and one entry per customer and range rather than per spelling.
+    from_idx, to_idx = _forecast_month_range(from_month, to_month) or (None, None)
+    stale_key = (
+        "forecasts-by-customer-stale:"
+        f"{hashlib.md5(customer_name.lower().encode()).hexdigest()}:{from_idx}:{to_idx}"
+    )
+    try:
+        return _forecasts_by_customer_response(
+            request, customer_name, from_month, to_month,
+            stale_key=stale_key if fallback else None,
+        )
+    except (OperationalError, InterfaceError):
+        stale = cache.get(stale_key) if fallback else None
+        if stale is None:
+            raise
+        response = HttpResponse(stale, content_type="application/json")
+        response["X-Cache"] = "STALE"
+        return response
+
 
+def _forecast_month_range(from_month, to_month):
+    """
+    (from_idx, to_idx) in ascending order, (None, None) when neither is
+    given, or None when either one is given but can't be parsed.
+    """
     from_idx = _month_index_from_string(from_month) if from_month else None
     to_idx = _month_index_from_string(to_month) if to_month else None
     if (from_month or to_month) and (from_idx is None or to_idx is None):
+        return None
+    if from_idx is not None and to_idx is not None and from_idx > to_idx:
+        from_idx, to_idx = to_idx, from_idx
+    return from_idx, to_idx
+
+
+def _if_none_match(request, etag):
+    """True if If-None-Match lists `etag` (weak comparison) or is `*`."""
+    tags = parse_etags(request.headers.get("If-None-Match", ""))
+    return "*" in tags or any(t.removeprefix("W/") == etag.removeprefix("W/") for t in tags)
+
+
+def _forecasts_by_customer_response(request, customer_name, from_month, to_month, stale_key=None):
+    customer = Customer.objects.filter(customer_name__iexact=customer_name).first()
+    if not customer:
+        return jresponse({"error": f"Customer '{customer_name}' not found"}, status=404)
+
+    month_range = _forecast_month_range(from_month, to_month)
+    if month_range is None:
         return jresponse(
             {"error": "from_month/to_month must be valid month names or numbers (e.g. January, Feb, 1, 12)."},
             status=400,
         )
-    if from_idx is not None and to_idx is not None and from_idx > to_idx:
-        from_idx, to_idx = to_idx, from_idx
+    from_idx, to_idx = month_range
+
+    # Any create, update or delete of this customer's forecasts changes the
+    # count or the latest updated_at, so stale entries are never read back.
+    stamp = Forecast.objects.filter(customer=customer).aggregate(
+        n=Count("id"), latest=Max("updated_at")
+    )
+    cache_key = (
+        f"forecasts-by-customer:{customer.pk}:{stamp['n']}:"
+        f"{stamp['latest'].isoformat() if stamp['latest'] else ''}:{from_idx}:{to_idx}"
+    )
+    etag = f'W/"{hashlib.md5(cache_key.encode()).hexdigest()}"'
+    if _if_none_match(request, etag):
+        response = HttpResponse(status=304)
+        response["ETag"] = etag
+        return response
+
+    body = cache.get(cache_key)
+    if body is not None:
+        response = HttpResponse(body, content_type="application/json")
+        response["ETag"] = etag
+        return response
 
     forecasts = Forecast.objects.filter(customer=customer).select_related("customer").order_by("part_number")
+    month_index = _month_index_from_string
     result = []
     for f in forecasts:
         out = _forecast_to_output(f)
         out["id"] = f.id
         if from_idx is not None and to_idx is not None:
-            total_range = 0.0
-            for m in (f.monthly_forecasts or []):
-                if isinstance(m, dict):
-                    mi = _month_index_from_string(m.get("date", ""))
-                    if mi is None:
-                        continue
-                    if from_idx <= mi <= to_idx:
-                        price = float(m.get("unit_price", 0))
-                        qty = float(m.get("quantity", 0))
-                        total_range += price * qty
-            out["total_amount_selected_months"] = total_range
+            out["total_amount_selected_months"] = sum(
+                (
+                    float(m.get("unit_price", 0)) * float(m.get("quantity", 0))
+                    for m in (f.monthly_forecasts or [])
+                    if isinstance(m, dict)
+                    and (mi := month_index(m.get("date", ""))) is not None
+                    and from_idx <= mi <= to_idx
+                ),
+                0.0,
+            )
         result.append(out)
-    return jresponse(result)
+
+    response = jresponse(result)
+    cache.set(cache_key, response.content, 3600)
+    if stale_key:
+        # Refreshed only when a body is built; cache hits and 304s leave it.
+        cache.set(stale_key, response.content, None)
+    response["ETag"] = etag
+    return response
 
 
 @api.put("/forecasts/{customer_name}/{part_number}", tags=["FORECAST"])
@@ -917,11 +1150,12 @@ def update_forecast(request, customer_name: str, part_number: str, payload: Fore
     if not original_customer:
         return jresponse({"error": f"Customer '{original_customer_name}' not found"}, status=404)
 
-    # Find forecast by original customer and original part_number
+    # Find forecast by original customer and original part_number.
+    # monthly_forecasts is replaced wholesale below, so don't load it.
     forecast = Forecast.objects.filter(
         customer=original_customer,
         part_number=original_part_number
-    ).first()
+    ).defer("monthly_forecasts").first()
     
     if not forecast:
         return jresponse(
@@ -968,14 +1202,7 @@ def update_forecast(request, customer_name: str, part_number: str, payload: Fore
     forecast.part_name = new_part_name
 
     # Update monthly forecasts
-    monthly = []
-    for m in (payload.monthly_forecasts or []):
-        monthly.append({
-            "date": m.date,
-            "unit_price": float(m.unit_price),
-            "quantity": float(m.quantity),
-        })
-    forecast.monthly_forecasts = monthly
+    forecast.monthly_forecasts = _monthly_payload(payload.monthly_forecasts)
 
     # Save the forecast
     forecast.save()
@@ -1026,23 +1253,28 @@ def delete_forecast(request, customer_name: str, part_number: str):
         return jresponse({"error": "part_number is required"}, status=400)
 
     # Find customer
-    customer = Customer.objects.filter(customer_name__iexact=customer_name).first()
-    if not customer:
+    customer_id = (
+        Customer.objects.filter(customer_name__iexact=customer_name)
+        .values_list("id", flat=True)
+        .first()
+    )
+    if not customer_id:
         return jresponse({"error": f"Customer '{customer_name}' not found"}, status=404)
 
-    # Find and delete forecast
-    forecast = Forecast.objects.filter(
-        customer=customer,
+    # Find and delete forecast (only its id is needed, not the JSON payload)
+    forecast_id = Forecast.objects.filter(
+        customer_id=customer_id,
         part_number=part_number
-    ).first()
+    ).values_list("id", flat=True).first()
     
-    if not forecast:
+    if not forecast_id:
         return jresponse(
             {"error": f"Forecast with part_number '{part_number}' not found for customer '{customer_name}'"},
             status=404
         )
     
-    forecast.delete()
+    Forecast.objects.filter(id=forecast_id).delete()
+    drop_dashboard_counts(Forecast)
     return jresponse(
         {
             "message": "Forecast deleted successfully",
@@ -1081,3 +1313,66 @@ def create_master_material(request, payload: MaterialListIn):
         },
         status=201
     )
+
+
+@api.post("/master/materials/bulk", tags=["MASTER LIST"])
+def create_master_materials_bulk(request, payload: MaterialListBulkIn):
+    """
+    Bulk version of create_master_material.
+    Codes already in the master list (or repeated in the payload) are skipped;
+    items without a mat_partcode are reported by their index in "invalid".
+    Returns 201 if anything was created, 200 otherwise.
+    """
+    items = {}
+    invalid = []
+    for i, p in enumerate(payload.items):
+        code = (p.mat_partcode or "").strip()
+        if not code:
+            invalid.append(i)
+        elif code not in items:
+            items[code] = MaterialList(
+                mat_partcode=code,
+                mat_partname=(p.mat_partname or "").strip(),
+                mat_maker=(p.mat_maker or "").strip(),
+                unit=(p.unit or "").strip(),
+            )
+
+    if not items:
+        return jresponse(
+            {"error": "at least one item with mat_partcode is required", "invalid": invalid},
+            status=400,
+        )
+
+    with transaction.atomic():
+        existing = set(
+            MaterialList.objects.filter(mat_partcode__in=list(items))
+            .values_list("mat_partcode", flat=True)
+        )
+        new_objs = [obj for code, obj in items.items() if code not in existing]
+        try:
+            with transaction.atomic():
+                MaterialList.objects.bulk_create(new_objs, batch_size=1000)
+            created = [o.mat_partcode for o in new_objs]
+        except IntegrityError:
+            # A concurrent request inserted some of these codes after the
+            # check above; insert one by one so only those are skipped.
+            created = []
+            for obj in new_objs:
+                obj.pk = None
+                try:
+                    with transaction.atomic():
+                        obj.save(force_insert=True)
+                except IntegrityError:
+                    continue
+                created.append(obj.mat_partcode)
+
+    created_set = set(created)
+    return jresponse(
+        {
+            "message": "Master materials created" if created else "No new master materials",
+            "created": created,
+            "skipped": sorted(code for code in items if code not in created_set),
+            "invalid": invalid,
+        },
+        status=201 if created else 200
+    )
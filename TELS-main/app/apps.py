@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class AppConfig(AppConfig):
     name = "app"
+
+    def ready(self):
+        from .signals import connect_dashboard_count_signals
+
+        connect_dashboard_count_signals()
@@ -1,5 +1,7 @@
 from django import forms
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
 from .models import EmployeeProfile
 
 
@@ -14,10 +16,16 @@ class EmployeeCreateForm(forms.ModelForm):
     def clean_employee_id(self):
         emp_id = self.cleaned_data["employee_id"].strip()
 
-        if EmployeeProfile.objects.filter(employee_id=emp_id).exists():
+        # One query for both checks: users owning this username or this employee_id.
+        taken = list(
+            User.objects.filter(Q(username=emp_id) | Q(employeeprofile__employee_id=emp_id))
+            .values_list("employeeprofile__employee_id", flat=True)
+        )
+
+        if emp_id in taken:
             raise forms.ValidationError("Employee ID already exists.")
 
-        if User.objects.filter(username=emp_id).exists():
+        if taken:
             raise forms.ValidationError("Employee ID already exists in auth system.")
 
         return emp_id
@@ -32,19 +40,15 @@ class EmployeeCreateForm(forms.ModelForm):
 
         return cleaned
 
+    @transaction.atomic
     def save(self, commit=True):
         employee_id = self.cleaned_data["employee_id"].strip()
         password = self.cleaned_data["password"]
 
-        user = User.objects.create_user(
-            username=employee_id,
-            password=password
-        )
-
-        user.is_staff = True
-        user.is_active = True
-        if commit:
-            user.save()
+        # Flags are set before the INSERT so no follow-up UPDATE is needed.
+        user = User(username=User.normalize_username(employee_id), is_staff=True, is_active=True)
+        user.set_password(password)
+        user.save()
 
         profile = super().save(commit=False)
         profile.user = user
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-14 09:00
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_forecast'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(django.db.models.functions.text.Upper('customer_name'), name='cust_name_upper_idx'),
+        ),
+    ]
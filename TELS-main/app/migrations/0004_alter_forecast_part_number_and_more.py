@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-14 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_customer_cust_name_upper_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='forecast',
+            name='part_number',
+            field=models.CharField(db_index=True, max_length=80),
+        ),
+        migrations.AddIndex(
+            model_name='tepcode',
+            index=models.Index(fields=['tep_code'], name='tepcode_tep_code_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0.2 on 2026-10-14 10:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_alter_forecast_part_number_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forecast',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
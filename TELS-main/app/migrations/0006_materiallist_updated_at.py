@@ -0,0 +1,20 @@
+# Generated by Django 6.0.2 on 2026-10-14 10:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_forecast_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='materiallist',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
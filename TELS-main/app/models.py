@@ -8,15 +8,49 @@ from django.db import models
 from django.core.exceptions import ValidationError
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.db.models.functions import Upper
+from django.utils.functional import cached_property
 
 class Customer(models.Model):
     customer_name = models.CharField(max_length=120, unique=True)
 
     parts = models.JSONField(default=list, blank=True)
 
+    class Meta:
+        indexes = [
+            # Backs the customer_name__iexact lookups in the forecast API.
+            models.Index(Upper("customer_name"), name="cust_name_upper_idx"),
+        ]
+
     def __str__(self):
         return self.customer_name
 
+    @cached_property
+    def partcode_set(self):
+        """
+        Set of stripped Partcode values in parts, built once per instance.
+        """
+        return {
+            str(p.get("Partcode", "")).strip()
+            for p in (self.parts or [])
+            if isinstance(p, dict)
+        }
+
+    @cached_property
+    def parts_map(self):
+        """
+        {stripped Partcode: stripped Partname} for parts, built once per
+        instance. The first entry wins when a Partcode repeats.
+        """
+        mapping = {}
+        for p in (self.parts or []):
+            if isinstance(p, dict):
+                mapping.setdefault(
+                    str(p.get("Partcode", "")).strip(),
+                    str(p.get("Partname", "")).strip(),
+                )
+        return mapping
+
     def clean(self):
         """
         Optional validation to keep parts JSON clean.
@@ -54,6 +88,10 @@ class TEPCode(models.Model):
 
     class Meta:
         unique_together = ("customer", "part_code", "tep_code")
+        indexes = [
+            # The by-code API endpoints look TEPs up by tep_code alone.
+            models.Index(fields=["tep_code"], name="tepcode_tep_code_idx"),
+        ]
 
     def __str__(self):
         return f"{self.customer.customer_name} | {self.part_code} | {self.tep_code}"
@@ -99,6 +137,7 @@ class MaterialList(models.Model):
     mat_partname = models.CharField(max_length=160)
     mat_maker = models.CharField(max_length=120)
     unit = models.CharField(max_length=10, choices=UNIT_CHOICES)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.mat_partname} ({self.mat_partcode})"
@@ -122,6 +161,13 @@ class EmployeeProfile(models.Model):
         return f"{self.employee_id} - {self.full_name}"
 
 
+MONTH_NAMES = (
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+)
+ABBR_TO_MONTH = {name[:3].lower(): name for name in MONTH_NAMES}
+
+
 class Forecast(models.Model):
     """
     Forecast for a part: part_number, part_name, and monthly forecasts.
@@ -134,13 +180,14 @@ class Forecast(models.Model):
         null=True,
         blank=True,
     )
-    part_number = models.CharField(max_length=80)
+    part_number = models.CharField(max_length=80, db_index=True)
     part_name = models.CharField(max_length=200)
     monthly_forecasts = models.JSONField(
         default=list,
         blank=True,
         help_text="List of {date, unit_price, quantity} per month, e.g. [{'date': 'Jan-2026', 'unit_price': 0.13, 'quantity': 1000}]",
     )
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["part_number"]
@@ -155,12 +202,6 @@ class Forecast(models.Model):
     @property
     def months_display(self):
         """Return month names (e.g. January, February) from monthly_forecasts dates."""
-        months = [
-            "January", "February", "March", "April", "May", "June",
-            "July", "August", "September", "October", "November", "December"
-        ]
-        abbr = ["jan", "feb", "mar", "apr", "may", "jun",
-                "jul", "aug", "sep", "oct", "nov", "dec"]
         items = self.monthly_forecasts or []
         names = []
         seen = set()
@@ -169,16 +210,11 @@ class Forecast(models.Model):
                 d = str(m.get("date", "")).strip()
                 if not d:
                     continue
-                s_lower = d.lower()
-                found = None
-                for i, a in enumerate(abbr):
-                    if s_lower.startswith(a) or s_lower == a:
-                        found = months[i]
-                        break
+                found = ABBR_TO_MONTH.get(d.lower()[:3])
                 if found is None:
                     try:
                         n = int(d.split("-")[0] if "-" in d else d.split("/")[0] if "/" in d else d)
-                        found = months[n - 1] if 1 <= n <= 12 else d
+                        found = MONTH_NAMES[n - 1] if 1 <= n <= 12 else d
                     except (ValueError, IndexError):
                         found = d
                 if found and found not in seen:
@@ -186,50 +222,56 @@ class Forecast(models.Model):
                     names.append(found)
         return ", ".join(names) if names else "—"
 
+    def _aggregate(self):
+        """One pass over monthly_forecasts for the price/quantity properties below."""
+        total_qty = 0.0
+        total_amt = 0.0
+        first_price = None
+        last_qty = None
+        for m in (self.monthly_forecasts or []):
+            if not isinstance(m, dict):
+                continue
+            try:
+                qty = float(m.get("quantity", 0) or 0)
+            except (TypeError, ValueError):
+                qty = None
+            try:
+                price = float(m.get("unit_price", 0) or 0)
+            except (TypeError, ValueError):
+                price = None
+
+            last_qty = qty if qty is not None else 0.0
+            if qty is not None:
+                total_qty += qty
+            if price is not None:
+                if first_price is None:
+                    first_price = price
+                if qty is not None:
+                    total_amt += price * qty
+
+        return {
+            "base_unit_price": first_price if first_price is not None else 0.0,
+            "latest_quantity": last_qty if last_qty is not None else 0.0,
+            "total_quantity": total_qty,
+            "total_amount": total_amt,
+        }
+
     @property
     def base_unit_price(self) -> float:
         """Unit price (assumes same price for all months, uses first entry)."""
-        for m in (self.monthly_forecasts or []):
-            if isinstance(m, dict):
-                try:
-                    return float(m.get("unit_price", 0) or 0)
-                except (TypeError, ValueError):
-                    continue
-        return 0.0
+        return self._aggregate()["base_unit_price"]
 
     @property
     def latest_quantity(self) -> float:
         """Quantity from the last monthly entry (most recent month in the list)."""
-        items = [m for m in (self.monthly_forecasts or []) if isinstance(m, dict)]
-        if not items:
-            return 0.0
-        try:
-            return float(items[-1].get("quantity", 0) or 0)
-        except (TypeError, ValueError):
-            return 0.0
+        return self._aggregate()["latest_quantity"]
 
     @property
     def total_quantity(self) -> float:
         """Sum of quantities across all months."""
-        total = 0.0
-        for m in (self.monthly_forecasts or []):
-            if isinstance(m, dict):
-                try:
-                    total += float(m.get("quantity", 0) or 0)
-                except (TypeError, ValueError):
-                    continue
-        return total
+        return self._aggregate()["total_quantity"]
 
     @property
     def total_amount(self) -> float:
         """Sum over all months of (unit_price * quantity)."""
-        total = 0.0
-        for m in (self.monthly_forecasts or []):
-            if isinstance(m, dict):
-                try:
-                    price = float(m.get("unit_price", 0) or 0)
-                    qty = float(m.get("quantity", 0) or 0)
-                    total += price * qty
-                except (TypeError, ValueError):
-                    continue
-        return total
+        return self._aggregate()["total_amount"]
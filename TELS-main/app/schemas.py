@@ -65,6 +65,9 @@ class MaterialListIn(Schema):
     mat_maker: str
     unit: str
 
+class MaterialListBulkIn(Schema):
+    items: List[MaterialListIn]
+
 class MaterialListOut(Schema):
     mat_partcode: str
     mat_partname: str
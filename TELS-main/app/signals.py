@@ -0,0 +1,47 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+from .models import Customer, TEPCode, Material, Forecast
+
+
+# Models whose row counts are shown on the admin dashboard header.
+DASHBOARD_COUNTED_MODELS = (Customer, TEPCode, Material, User, Forecast)
+
+# Counts that also change when one of these is deleted, through CASCADE.
+# TEPCode, Material and Forecast get no post_delete receiver of their own:
+# any receiver makes Django fetch and delete cascaded rows one by one
+# instead of with a single DELETE ... WHERE ... IN, so the views and API
+# endpoints that delete them call drop_dashboard_counts() themselves.
+DASHBOARD_DELETE_CASCADES = {
+    Customer: (Customer, TEPCode, Material, Forecast),
+    User: (User,),
+}
+
+
+def dashboard_count_key(model):
+    return f"dash:count:{model._meta.label_lower}"
+
+
+def drop_dashboard_counts(*models):
+    """Drop the cached header counts of `models` after deleting their rows."""
+    cache.delete_many([dashboard_count_key(m) for m in models])
+
+
+def _drop_dashboard_count(sender, created=True, **kwargs):
+    # Only inserts change a count; plain updates keep the entry.
+    if created:
+        cache.delete(dashboard_count_key(sender))
+
+
+def _drop_dashboard_counts_on_delete(sender, **kwargs):
+    drop_dashboard_counts(*DASHBOARD_DELETE_CASCADES[sender])
+
+
+def connect_dashboard_count_signals():
+    for model in DASHBOARD_COUNTED_MODELS:
+        uid = f"dashboard-count:{model._meta.label_lower}"
+        post_save.connect(_drop_dashboard_count, sender=model, dispatch_uid=f"{uid}:save")
+    for model in DASHBOARD_DELETE_CASCADES:
+        uid = f"dashboard-count:{model._meta.label_lower}"
+        post_delete.connect(_drop_dashboard_counts_on_delete, sender=model, dispatch_uid=f"{uid}:delete")
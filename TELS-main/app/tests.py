@@ -1,3 +1,422 @@
-from django.test import TestCase
+import json
+import warnings
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.db import OperationalError, connection
+from django.contrib.messages import get_messages
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse, set_script_prefix
+
+from . import api
+from .models import Customer, Forecast, Material, MaterialList, TEPCode
+from .views import _cached_model_count, _dashboard_tab_url, _ensure_customer_part_entry
+
+
+class AdminCsvUploadEncodingTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin)
+
+    def upload(self, body):
+        return self.client.post(
+            reverse("app:admin_csv_upload"),
+            {"csv_file": SimpleUploadedFile("materials.csv", body)},
+        )
+
+    def test_cp1252_accent_after_ascii_sample(self):
+        # The first 64 KiB are plain ASCII, so the upload starts out streamed
+        # as UTF-8 and has to fall back once it reaches the cp1252 byte.
+        lines = ["mat_partcode,mat_partname,mat_maker,unit"]
+        lines += [f"P{i:04d},Wire harness clip {i:04d},Generic Maker,pc" for i in range(3000)]
+        lines.append("P9999,Café Müller,Müller GmbH,kg")
+        body = ("\n".join(lines) + "\n").encode("cp1252")
+        self.assertGreater(len(body), 65536)
+
+        response = self.upload(body)
+
+        msgs = [str(m) for m in get_messages(response.wsgi_request)]
+        self.assertIn("CSV uploaded successfully | master_inserted=3001, master_updated=0", msgs)
+        master = MaterialList.objects.get(mat_partcode="P9999")
+        self.assertEqual(master.mat_partname, "Café Müller")
+        self.assertEqual(master.mat_maker, "Müller GmbH")
+
+    def test_utf8_upload(self):
+        body = "mat_partcode,mat_partname,mat_maker,unit\nA1,Räder,Maker,m\n".encode("utf-8-sig")
+
+        self.upload(body)
+
+        self.assertEqual(MaterialList.objects.get(mat_partcode="A1").mat_partname, "Räder")
+
+
+class CustomerPartEntryTests(TestCase):
+    def test_stale_instances_do_not_duplicate_a_partcode(self):
+        customer = Customer.objects.create(customer_name="Acme", parts=[{"Partcode": "A", "Partname": "Tape"}])
+        first = Customer.objects.get(pk=customer.pk)
+        second = Customer.objects.get(pk=customer.pk)
+
+        self.assertEqual(_ensure_customer_part_entry(first, "C", "Clip"), (True, "Clip"))
+        self.assertEqual(_ensure_customer_part_entry(second, "C", "Other"), (False, "Clip"))
+
+        customer.refresh_from_db()
+        self.assertEqual([p["Partcode"] for p in customer.parts], ["A", "C"])
+
+    def test_forecast_delete_keeps_parts_appended_since_load(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        customer = Customer.objects.create(customer_name="Acme", parts=[{"Partcode": "A", "Partname": "Tape"}])
+        Forecast.objects.create(customer=customer, part_number="A", part_name="Tape", monthly_forecasts=[])
+
+        def append_meanwhile(*models):
+            # Runs after the handler loaded the customer, before it drops "A".
+            _ensure_customer_part_entry(Customer.objects.get(pk=customer.pk), "C", "Clip")
+
+        with mock.patch("app.views.drop_dashboard_counts", side_effect=append_meanwhile):
+            self.client.post(reverse("app:admin_dashboard"), {
+                "action": "delete_forecast", "customer_name": "Acme", "part_number": "A",
+            })
+
+        customer.refresh_from_db()
+        self.assertEqual(customer.parts, [{"Partcode": "C", "Partname": "Clip"}])
+
+
+class UpdateTepMaterialApiTests(TestCase):
+    def setUp(self):
+        customer = Customer.objects.create(customer_name="Acme", parts=[{"Partcode": "P1", "Partname": "Part"}])
+        self.tep = TEPCode.objects.create(customer=customer, part_code="P1", tep_code="T1")
+        MaterialList.objects.create(mat_partcode="M1", mat_partname="Tape", mat_maker="Maker A", unit="m")
+        MaterialList.objects.create(mat_partcode="M2", mat_partname="Clip", mat_maker="Maker B", unit="pc")
+        self.material = Material.objects.create(
+            tep_code=self.tep, mat_partcode="M1", mat_partname="Tape", mat_maker="Maker A",
+            unit="m", dim_qty=1, loss_percent=10, total=1.1,
+        )
+
+    def put(self, path, body):
+        return self.client.put(path, data=json.dumps(body), content_type="application/json")
+
+    def test_rename_takes_the_new_master_fields(self):
+        response = self.put("/api/tep-codes/T1/materials/M1", {"mat_partcode": "M2", "dim_qty": 2, "loss_percent": 50})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            "mat_partcode": "M2", "mat_partname": "Clip", "mat_maker": "Maker B",
+            "unit": "pc", "dim_qty": 2.0, "loss_percent": 50.0, "total": 3.0,
+        })
+
+    def test_rename_to_unknown_or_taken_code_is_refused(self):
+        Material.objects.create(
+            tep_code=self.tep, mat_partcode="M2", mat_partname="Clip", mat_maker="Maker B",
+            unit="pc", dim_qty=1, loss_percent=10, total=1.1,
+        )
+
+        self.assertEqual(self.put("/api/tep-codes/T1/materials/M1", {"mat_partcode": "ZZ", "dim_qty": 1}).status_code, 404)
+        self.assertEqual(self.put("/api/tep-codes/T1/materials/M1", {"mat_partcode": "M2", "dim_qty": 1}).status_code, 409)
+        self.material.refresh_from_db()
+        self.assertEqual(self.material.mat_partcode, "M1")
+
+    def test_ambiguous_tep_code_is_refused(self):
+        other = Customer.objects.create(customer_name="Beta", parts=[{"Partcode": "P9", "Partname": "Other"}])
+        other_tep = TEPCode.objects.create(customer=other, part_code="P9", tep_code="T1")
+        Material.objects.create(
+            tep_code=other_tep, mat_partcode="M1", mat_partname="Tape", mat_maker="Maker A",
+            unit="m", dim_qty=1, loss_percent=10, total=1.1,
+        )
+
+        response = self.put("/api/tep-codes/T1/materials/M1", {"mat_partcode": "M1", "dim_qty": 5})
+        self.assertEqual(response.status_code, 409)
+
+        response = self.put("/api/tep-codes/T1/materials/M1?customer_name=Acme", {"mat_partcode": "M1", "dim_qty": 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total"], 5.5)
+
+    def test_plain_update_is_one_lookup_an_update_and_a_readback(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.put("/api/tep-codes/T1/materials/M1", {"mat_partcode": "M1", "dim_qty": 3})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total"], 3.3)
+        sql = [q["sql"] for q in queries if not q["sql"].startswith(("SAVEPOINT", "RELEASE"))]
+        self.assertEqual(len(sql), 3)
+
+
+@override_settings(CACHE_FALLBACK_ENABLED=True)
+class ForecastsByCustomerStaleCacheTests(TestCase):
+    url = "/api/forecasts/by-customer/Acme Trading Co?from_month=March&to_month=jan"
+
+    def setUp(self):
+        cache.clear()
+        customer = Customer.objects.create(customer_name="Acme Trading Co")
+        Forecast.objects.create(
+            customer=customer, part_number="P1", part_name="Part",
+            monthly_forecasts=[{"date": "January-2026", "unit_price": 2, "quantity": 5}],
+        )
+
+    def stale_sets(self, calls):
+        return [c for c in calls if c.args[0].startswith("forecasts-by-customer-stale:")]
+
+    def test_stale_copy_is_written_only_for_a_fresh_body(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", CacheKeyWarning)
+            with mock.patch.object(api.cache, "set", wraps=cache.set) as cache_set:
+                self.assertEqual(self.client.get(self.url).status_code, 200)
+                self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        stale_sets = self.stale_sets(cache_set.call_args_list)
+        self.assertEqual(len(stale_sets), 1)
+        self.assertTrue(stale_sets[0].args[0].endswith(":1:3"))
+
+    def test_stale_copy_is_served_when_the_database_is_down(self):
+        fresh = self.client.get(self.url)
+
+        with mock.patch.object(api, "_forecasts_by_customer_response", side_effect=OperationalError):
+            response = self.client.get("/api/forecasts/by-customer/ACME TRADING CO?from_month=1&to_month=3")
+
+        self.assertEqual(response["X-Cache"], "STALE")
+        self.assertEqual(response.content, fresh.content)
+
+
+class ForecastsByCustomerConditionalTests(TestCase):
+    url = "/api/forecasts/by-customer/Acme"
+
+    def setUp(self):
+        cache.clear()
+        customer = Customer.objects.create(customer_name="Acme")
+        Forecast.objects.create(
+            customer=customer, part_number="P1", part_name="Part",
+            monthly_forecasts=[{"date": "January-2026", "unit_price": 2, "quantity": 5}],
+        )
+
+    def test_matching_tag_in_the_list_is_304(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        response = self.client.get(self.url, headers={"If-None-Match": f'"other", {etag.removeprefix("W/")}'})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(self.client.get(self.url, headers={"If-None-Match": "*"}).status_code, 304)
+
+    def test_other_tags_are_200(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        response = self.client.get(self.url, headers={"If-None-Match": f'{etag[:-1]}x", "other"'})
+
+        self.assertEqual(response.status_code, 200)
+
+
+class ForecastsByCustomerBodyCacheTests(TestCase):
+    url = "/api/forecasts/by-customer/Acme"
+
+    def setUp(self):
+        cache.clear()
+        self.customer = Customer.objects.create(customer_name="Acme")
+        self.forecast = Forecast.objects.create(
+            customer=self.customer, part_number="P1", part_name="Part",
+            monthly_forecasts=[{"date": "January-2026", "unit_price": 2, "quantity": 5}],
+        )
+
+    def test_repeat_request_is_served_from_the_cached_body(self):
+        first = self.client.get(self.url)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(self.url)
+
+        self.assertEqual(second.content, first.content)
+        forecast_selects = [q["sql"] for q in queries if 'FROM "app_forecast"' in q["sql"]]
+        self.assertEqual(len(forecast_selects), 1)
+        self.assertIn("MAX(", forecast_selects[0])
+
+    def quantities(self):
+        return {
+            f["Customer"]["part_number"]: [m["quantity"] for m in f["Customer"]["monthly_forecasts"]]
+            for f in self.client.get(self.url).json()
+        }
+
+    def test_forecast_writes_produce_a_fresh_body(self):
+        self.assertEqual(self.quantities(), {"P1": [5.0]})
+
+        self.forecast.monthly_forecasts = [{"date": "January-2026", "unit_price": 2, "quantity": 7}]
+        self.forecast.save()
+        self.assertEqual(self.quantities(), {"P1": [7.0]})
+
+        Forecast.objects.create(customer=self.customer, part_number="P2", part_name="Two", monthly_forecasts=[])
+        self.assertEqual(self.quantities(), {"P1": [7.0], "P2": []})
+
+        self.forecast.delete()
+        self.assertEqual(self.quantities(), {"P2": []})
+
+
+class CustomerByPartcodeTests(TestCase):
+    def test_matches_trimmed_and_numeric_partcodes(self):
+        Customer.objects.create(customer_name="Other", parts=[{"Partcode": "X1", "Partname": "X"}])
+        padded = Customer.objects.create(customer_name="Padded", parts=["junk", {"Partcode": " AB-1 ", "Partname": "A"}])
+        numeric = Customer.objects.create(customer_name="Numeric", parts=[{"Partcode": 1234, "Partname": "N"}])
+
+        self.assertEqual(api._customer_by_partcode("AB-1"), padded)
+        self.assertEqual(api._customer_by_partcode("1234"), numeric)
+        self.assertIsNone(api._customer_by_partcode("ZZ"))
+
+
+class MasterMaterialsBulkApiTests(TestCase):
+    url = "/api/master/materials/bulk"
+
+    def post(self, *codes):
+        items = [{"mat_partcode": c, "mat_partname": f"Name {c}", "mat_maker": "Maker", "unit": "pc"} for c in codes]
+        return self.client.post(self.url, data=json.dumps({"items": items}), content_type="application/json")
+
+    def test_reports_created_skipped_and_invalid(self):
+        MaterialList.objects.create(mat_partcode="OLD", mat_partname="Old", mat_maker="Maker", unit="pc")
+
+        response = self.post("NEW", "OLD", " ", "NEW")
+
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body["created"], body["skipped"], body["invalid"]), (["NEW"], ["OLD"], [2]))
+
+    def test_nothing_new_is_200(self):
+        MaterialList.objects.create(mat_partcode="OLD", mat_partname="Old", mat_maker="Maker", unit="pc")
+
+        response = self.post("OLD")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["created"], [])
+
+    def test_concurrent_insert_is_not_reported_as_created(self):
+        # RACE lands after the existence check, which is made to miss it.
+        MaterialList.objects.create(mat_partcode="RACE", mat_partname="Theirs", mat_maker="Other", unit="m")
+
+        with mock.patch.object(MaterialList.objects, "filter", return_value=MaterialList.objects.none()):
+            response = self.post("RACE", "MINE")
+
+        body = response.json()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((body["created"], body["skipped"]), (["MINE"], ["RACE"]))
+        self.assertEqual(MaterialList.objects.get(mat_partcode="RACE").mat_partname, "Theirs")
+        self.assertTrue(MaterialList.objects.filter(mat_partcode="MINE").exists())
+
+
+class CustomerAdminQuerysetTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        self.customer = Customer.objects.create(
+            customer_name="Acme", parts=[{"Partcode": "P1", "Partname": "Part"}, {"Partcode": "P2", "Partname": "Two"}],
+        )
+        TEPCode.objects.create(customer=self.customer, part_code="P1", tep_code="T1")
+
+    def test_changelist_shows_counts(self):
+        response = self.client.get(reverse("admin:app_customer_changelist"), {"o": "2"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<td class="field-parts_count">2</td>', html=True)
+        self.assertContains(response, '<td class="field-tep_count">1</td>', html=True)
+
+    def test_change_form_loads_parts_with_the_object(self):
+        url = reverse("admin:app_customer_change", args=[self.customer.pk])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "P2")
+        # Full-row fetches only: no annotated GROUP BY, and no follow-up
+        # query loading a deferred parts column on its own.
+        customer_selects = [q["sql"] for q in queries if 'FROM "app_customer"' in q["sql"]]
+        self.assertTrue(customer_selects)
+        for sql in customer_selects:
+            self.assertIn('"app_customer"."customer_name"', sql)
+            self.assertNotIn("GROUP BY", sql)
+
+
+class TEPCodeAdminQuerysetTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        customer = Customer.objects.create(customer_name="Acme", parts=[{"Partcode": "P1", "Partname": "Part"}])
+        self.tep = TEPCode.objects.create(customer=customer, part_code="P1", tep_code="T1")
+        Material.objects.create(tep_code=self.tep, mat_partcode="M1", mat_partname="Tape", dim_qty=1, total=1.1)
+
+    def test_changelist_shows_material_counts(self):
+        response = self.client.get(reverse("admin:app_tepcode_changelist"))
+
+        self.assertContains(response, '<td class="field-materials_count">1</td>', html=True)
+
+    def test_change_form_is_not_annotated(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("admin:app_tepcode_change", args=[self.tep.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        tep_selects = [q["sql"] for q in queries if 'FROM "app_tepcode"' in q["sql"]]
+        self.assertTrue(tep_selects)
+        for sql in tep_selects:
+            self.assertNotIn("GROUP BY", sql)
+
+
+class DashboardTabUrlTests(TestCase):
+    def test_follows_the_current_script_prefix(self):
+        self.addCleanup(set_script_prefix, "/")
+
+        set_script_prefix("/")
+        self.assertEqual(_dashboard_tab_url("users"), "/panel/dashboard/?tab=users")
+        set_script_prefix("/tels/")
+        self.assertEqual(_dashboard_tab_url("users"), "/tels/panel/dashboard/?tab=users")
+
+
+class DashboardCountCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = Customer.objects.create(customer_name="Acme")
+        self.forecast = Forecast.objects.create(
+            customer=self.customer, part_number="P1", part_name="Part",
+            monthly_forecasts=[{"date": "January-2026", "unit_price": 2, "quantity": 5}],
+        )
+
+    def test_insert_drops_the_count(self):
+        self.assertEqual(_cached_model_count(Forecast), 1)
+
+        Forecast.objects.create(customer=self.customer, part_number="P2", part_name="Two", monthly_forecasts=[])
+
+        self.assertEqual(_cached_model_count(Forecast), 2)
+
+    def test_dashboard_forecast_delete_drops_the_count(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        self.assertEqual(_cached_model_count(Forecast), 1)
+
+        self.client.post(reverse("app:admin_dashboard"), {
+            "action": "delete_forecast", "customer_name": "Acme", "part_number": "P1",
+            "forecast_id": self.forecast.pk, "date": "January-2026",
+        })
+
+        self.assertFalse(Forecast.objects.exists())
+        self.assertEqual(_cached_model_count(Forecast), 0)
+
+    def test_api_deletes_drop_the_counts(self):
+        tep = TEPCode.objects.create(customer=self.customer, part_code="P1", tep_code="T1")
+        Material.objects.create(tep_code=tep, mat_partcode="M1", mat_partname="Tape", dim_qty=1, total=1.1)
+        self.assertEqual((_cached_model_count(TEPCode), _cached_model_count(Material)), (1, 1))
+
+        self.assertEqual(self.client.delete("/api/tep-codes/T1").status_code, 200)
+
+        self.assertEqual((_cached_model_count(TEPCode), _cached_model_count(Material)), (0, 0))
+
+    def test_customer_delete_drops_the_cascaded_counts(self):
+        self.assertEqual(_cached_model_count(Forecast), 1)
+
+        self.customer.delete()
+
+        self.assertEqual((_cached_model_count(Customer), _cached_model_count(Forecast)), (0, 0))
+
+
+class ForecastTotalsTests(TestCase):
+    def test_totals_follow_monthly_forecasts(self):
+        forecast = Forecast.objects.create(
+            customer=Customer.objects.create(customer_name="Acme"), part_number="P1", part_name="Part",
+            monthly_forecasts=[{"date": "January-2026", "unit_price": 2, "quantity": 5}],
+        )
+        self.assertEqual((forecast.total_quantity, forecast.total_amount), (5.0, 10.0))
+
+        forecast.monthly_forecasts = [{"date": "January-2026", "unit_price": 3, "quantity": 4}]
+        self.assertEqual((forecast.base_unit_price, forecast.total_amount), (3.0, 12.0))
+
+        Forecast.objects.filter(pk=forecast.pk).update(monthly_forecasts=[{"date": "May-2026", "unit_price": 1, "quantity": 9}])
+        forecast.refresh_from_db()
+        self.assertEqual((forecast.total_quantity, forecast.latest_quantity), (9.0, 9.0))
@@ -1,14 +1,21 @@
 from django.views.decorators.cache import never_cache
 
 import json
+import codecs
 import csv
 import io
+import os
 import re
 from collections import defaultdict
+from datetime import date
+from functools import lru_cache
 
+from charset_normalizer import from_bytes
+from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.db import transaction
-from django.db.models import Q
+from django.db import connection, transaction
+from django.db.models import BooleanField, Count, F, Func, JSONField, Max, Prefetch, Q, Subquery, Value
+from django.db.models.expressions import CombinedExpression, RawSQL
 from django.http import HttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 
@@ -18,10 +25,13 @@ from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required, user_passes_test
 
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.http import url_has_allowed_host_and_scheme
 
-from .models import Customer, TEPCode, Material, MaterialList, Forecast
+from .models import Customer, TEPCode, Material, MaterialList, Forecast, MONTH_NAMES
+from .api import _material_name_re
 from .forms import EmployeeCreateForm
+from .signals import dashboard_count_key, drop_dashboard_counts
 
 from django.contrib.auth import logout
 from django.shortcuts import redirect
@@ -55,9 +65,6 @@ def login_view(request):
             if user.is_superuser:
                 return redirect("app:admin_dashboard")
 
-            if user.is_staff:
-                return redirect("app:customer_list")
-
             return redirect("app:customer_list")
         else:
             error = "Invalid Employee ID or password"
@@ -65,27 +72,97 @@ def login_view(request):
     return render(request, "login.html", {"error": error})
 
 
+def _cached_model_count(model, ttl=60):
+    """
+    Row count for the dashboard header cards. Inserts and the delete paths in
+    signals.py drop the entry; bulk writes, other workers' local caches and
+    deletes from outside the app are covered by the TTL.
+    """
+    return cache.get_or_set(dashboard_count_key(model), model.objects.count, ttl)
+
+
+def _dashboard_tab_url(tab):
+    """Dashboard URL for a tab. Reversed per call so the current script prefix applies."""
+    return reverse("app:admin_dashboard") + f"?tab={tab}"
+
+
+# Non-UTF-8 encodings an upload may be in (Excel's "Unicode Text" and
+# "CSV (Comma delimited)" exports). Left unrestricted, charset-normalizer
+# tends to name a Baltic or Central European codepage for Western text.
+_CSV_FALLBACK_ENCODINGS = ["utf_16", "cp1252", "latin_1"]
+
+
+def _decode_csv_bytes(raw):
+    """
+    Decode an uploaded CSV. UTF-8 (with or without BOM) is tried first since
+    that is what Excel's "CSV UTF-8" writes; otherwise charset-normalizer
+    picks among _CSV_FALLBACK_ENCODINGS instead of taking the first one that
+    happens to decode, which utf-16 and cp1252 do for most inputs. Returns
+    None if nothing fits.
+    """
+    try:
+        return raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        pass
+    best = from_bytes(raw, cp_isolation=_CSV_FALLBACK_ENCODINGS).best()
+    return str(best) if best is not None else None
+
+
+def _sniff_csv_encoding(sample):
+    """
+    Encoding name for an upload, judged from its first bytes only. A sample
+    that is valid UTF-8 up to a possibly cut-off last character is taken as
+    UTF-8; otherwise charset-normalizer picks among _CSV_FALLBACK_ENCODINGS.
+    Callers must be ready for a later part of the file not to decode.
+    """
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        pass
+    best = from_bytes(sample, cp_isolation=_CSV_FALLBACK_ENCODINGS).best()
+    return best.encoding if best is not None else None
+
+
+_WS_RE = re.compile(r"\s+")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]")
+
+
 def _normalize_space(s):
-    return re.sub(r"\s+", " ", (s or "").strip())
+    return _WS_RE.sub(" ", (s or "").strip())
+
+
+def _parts_index(customer):
+    """
+    {normalized Partcode: entry} and the set of lowercased Partnames for
+    customer.parts, built in one pass and kept on the instance until the
+    next save.
+    """
+    index = getattr(customer, "_parts_by_code", None)
+    if index is None:
+        index = {}
+        names_lower = set()
+        for p in customer.parts or []:
+            if isinstance(p, dict):
+                index.setdefault(_normalize_space(p.get("Partcode")), p)
+                n = _normalize_space(p.get("Partname"))
+                if n:
+                    names_lower.add(n.lower())
+        customer._parts_by_code = index
+        customer._names_lower = names_lower
+    return index, customer._names_lower
 
 
 def _unique_partname_for_customer(customer, base_name, part_code):
     base_name = _normalize_space(base_name)
     part_code = _normalize_space(part_code)
 
-    parts = customer.parts or []
-
-    for p in parts:
-        if isinstance(p, dict) and _normalize_space(p.get("Partcode")) == part_code:
-            existing = _normalize_space(p.get("Partname"))
-            return existing or base_name
+    index, existing_names = _parts_index(customer)
 
-    existing_names = set()
-    for p in parts:
-        if isinstance(p, dict):
-            n = _normalize_space(p.get("Partname"))
-            if n:
-                existing_names.add(n.lower())
+    entry = index.get(part_code)
+    if entry is not None:
+        existing = _normalize_space(entry.get("Partname"))
+        return existing or base_name
 
     if base_name.lower() not in existing_names:
         return base_name
@@ -102,50 +179,131 @@ def _ensure_customer_part_entry(customer, part_code, part_name):
     part_code = _normalize_space(part_code)
     part_name = _normalize_space(part_name) or part_code
 
-    parts = customer.parts or []
+    index, _ = _parts_index(customer)
 
-    for p in parts:
-        if isinstance(p, dict) and _normalize_space(p.get("Partcode")) == part_code:
-            used = _normalize_space(p.get("Partname")) or part_name
-            return False, used
+    entry = index.get(part_code)
+    if entry is not None:
+        used = _normalize_space(entry.get("Partname")) or part_name
+        return False, used
 
     unique_name = _unique_partname_for_customer(customer, part_name, part_code)
-    parts.append({"Partcode": part_code, "Partname": unique_name})
+
+    added = _append_customer_part(customer, {"Partcode": part_code, "Partname": unique_name})
+
+    del customer._parts_by_code, customer._names_lower
+
+    if not added:
+        # Another request stored this Partcode after customer was loaded;
+        # use the entry that is in the database now.
+        customer.refresh_from_db(fields=["parts"])
+        entry = _parts_index(customer)[0].get(part_code) or {}
+        return False, _normalize_space(entry.get("Partname")) or part_name
+
+    return True, unique_name
+
+
+def _append_customer_part(customer, entry):
+    """
+    Append entry to customer.parts unless the stored row already has its
+    Partcode. On PostgreSQL (jsonb ||) and SQLite (json_insert) both the
+    check and the append run in one UPDATE, so two appends can't overwrite
+    or duplicate each other; _remove_customer_part() locks the row for its
+    read-modify-write. Returns False if nothing was appended.
+    """
+    parts = customer.parts
+    vendor = connection.vendor
+
+    if isinstance(parts, list) and vendor in ("postgresql", "sqlite"):
+        col = f'"{Customer._meta.db_table}"."parts"'
+        if vendor == "postgresql":
+            appended = CombinedExpression(
+                F("parts"), "||", Value([entry], output_field=JSONField()),
+                output_field=JSONField(),
+            )
+            has_code = (
+                "SELECT 1 FROM jsonb_array_elements("
+                f"CASE WHEN jsonb_typeof({col}) = 'array' THEN {col} ELSE '[]'::jsonb END) p "
+                "WHERE btrim(p ->> 'Partcode') = %s"
+            )
+        else:
+            appended = Func(
+                F("parts"),
+                Value("$[#]"),
+                Func(Value(json.dumps(entry)), function="json"),
+                function="json_insert",
+                output_field=JSONField(),
+            )
+            has_code = (
+                f"SELECT 1 FROM json_each({col}) p "
+                f"WHERE trim(json_extract({col}, p.fullkey || '.Partcode')) = %s"
+            )
+        updated = (
+            Customer.objects
+            .filter(pk=customer.pk)
+            .filter(RawSQL(f"NOT EXISTS ({has_code})", (entry["Partcode"],), output_field=BooleanField()))
+            .update(parts=appended)
+        )
+        if not updated:
+            return False
+        parts.append(entry)
+        return True
+
+    parts = parts if isinstance(parts, list) else []
+    if any(isinstance(p, dict) and str(p.get("Partcode", "")).strip() == entry["Partcode"] for p in parts):
+        return False
+    parts.append(entry)
     customer.parts = parts
     customer.save(update_fields=["parts"])
-    return True, unique_name
+    return True
+
+
+def _remove_customer_part(customer, part_code):
+    """
+    Drop every customer.parts entry with this Partcode. The row is locked
+    while the list is rewritten, so entries appended meanwhile are kept.
+    """
+    with transaction.atomic():
+        parts = (
+            Customer.objects.select_for_update()
+            .filter(pk=customer.pk)
+            .values_list("parts", flat=True)
+            .first()
+        )
+        kept = [
+            p for p in (parts if isinstance(parts, list) else [])
+            if not (isinstance(p, dict) and str(p.get("Partcode", "")).strip() == part_code)
+        ]
+        Customer.objects.filter(pk=customer.pk).update(parts=kept)
+    customer.parts = kept
 
 
 def _allocate_material_name(tep, base_name: str, exclude_partcode: str = "") -> str:
     base = (base_name or "").strip() or "UNKNOWN"
     exclude_partcode = (exclude_partcode or "").strip()
 
-    qs = Material.objects.filter(
-        tep_code=tep,
-        mat_partname__iregex=rf"^{re.escape(base)}( \d+)?$"
-    )
+    name_re = _material_name_re(base)
+
+    # A prefix LIKE narrows the candidates; the exact "base" / "base N"
+    # match is done here rather than as a per-row regex in the database.
+    qs = Material.objects.filter(tep_code=tep, mat_partname__istartswith=base)
     if exclude_partcode:
         qs = qs.exclude(mat_partcode=exclude_partcode)
 
-    existing_names = list(qs.values_list("mat_partname", flat=True))
-    if not existing_names:
+    matches = [m for m in (name_re.match(n or "") for n in qs.values_list("mat_partname", flat=True)) if m]
+    if not matches:
         return base
 
-    numbers = []
-    for n in existing_names:
-        m = re.match(rf"^{re.escape(base)}(?: (\d+))?$", (n or "").strip(), flags=re.IGNORECASE)
-        if m and m.group(1):
-            numbers.append(int(m.group(1)))
+    numbers = [int(m.group(1)) for m in matches if m.group(1)]
 
     if not numbers:
         existing_base = Material.objects.filter(tep_code=tep, mat_partname__iexact=base)
         if exclude_partcode:
             existing_base = existing_base.exclude(mat_partcode=exclude_partcode)
 
-        first = existing_base.order_by("id").first()
-        if first:
-            first.mat_partname = f"{base} 1"
-            first.save(update_fields=["mat_partname"])
+        # Rename the earliest plain "base" row in a single UPDATE.
+        Material.objects.filter(
+            id=Subquery(existing_base.order_by("id").values("id")[:1])
+        ).update(mat_partname=f"{base} 1")
 
         return f"{base} 2"
 
@@ -155,19 +313,34 @@ def _allocate_material_name(tep, base_name: str, exclude_partcode: str = "") ->
 def build_customer_table(q: str):
     qs = (
         Customer.objects
-        .prefetch_related("tep_codes__materials")
+        .prefetch_related(
+            # Only the material count is shown, so count in SQL instead of
+            # prefetching every material row.
+            Prefetch(
+                "tep_codes",
+                queryset=TEPCode.objects.annotate(_mat_count=Count("materials")).order_by("tep_code"),
+            )
+        )
         .order_by("customer_name")
     )
 
     if q:
+        # Match TEP and material fields in id subqueries rather than joining
+        # customers to every TEP and material row and de-duplicating with
+        # DISTINCT.
+        tep_customers = TEPCode.objects.filter(
+            Q(tep_code__icontains=q) | Q(part_code__icontains=q)
+        ).values("customer_id")
+        material_customers = Material.objects.filter(
+            Q(mat_partcode__icontains=q)
+            | Q(mat_partname__icontains=q)
+            | Q(mat_maker__icontains=q)
+        ).values("tep_code__customer_id")
         qs = qs.filter(
             Q(customer_name__icontains=q)
-            | Q(tep_codes__tep_code__icontains=q)
-            | Q(tep_codes__part_code__icontains=q)
-            | Q(tep_codes__materials__mat_partcode__icontains=q)
-            | Q(tep_codes__materials__mat_partname__icontains=q)
-            | Q(tep_codes__materials__mat_maker__icontains=q)
-        ).distinct()
+            | Q(id__in=tep_customers)
+            | Q(id__in=material_customers)
+        )
 
     grouped = defaultdict(lambda: {
         "parts_by_code": {},
@@ -198,15 +371,13 @@ def build_customer_table(q: str):
         part_code_map = {}
 
         for pc in part_code_options:
-            tep_objs = sorted(teps_by_part.get(pc, []), key=lambda t: t.tep_code)
-
             teps = [
                 {
                     "tep_id": t.id,
                     "tep_code": t.tep_code,
-                    "materials_count": t.materials.count(),
+                    "materials_count": t._mat_count,
                 }
-                for t in tep_objs
+                for t in teps_by_part.get(pc, [])
             ]
 
             default_tep = teps[0] if teps else None
@@ -220,23 +391,88 @@ def build_customer_table(q: str):
             }
 
         default_pc = part_code_options[0] if part_code_options else ""
+        default_entry = part_code_map.get(default_pc, {})
 
         customers.append({
             "customer_name": name,
             "part_code_options": part_code_options,
             "default_part_code": default_pc,
 
-            "default_tep_options": part_code_map.get(default_pc, {}).get("teps", []),
-            "default_tep_id": part_code_map.get(default_pc, {}).get("default_tep_id"),
-            "default_tep_code": part_code_map.get(default_pc, {}).get("default_tep_code", ""),
-            "default_materials_count": part_code_map.get(default_pc, {}).get("default_materials_count", 0),
+            "default_tep_options": default_entry.get("teps", []),
+            "default_tep_id": default_entry.get("default_tep_id"),
+            "default_tep_code": default_entry.get("default_tep_code", ""),
+            "default_materials_count": default_entry.get("default_materials_count", 0),
 
-            "part_code_map_json": json.dumps(part_code_map, ensure_ascii=False),
+            # Embedded in a <script> block; compact separators keep the page small.
+            "part_code_map_json": json.dumps(part_code_map, ensure_ascii=False, separators=(",", ":")),
         })
 
     return customers
 
 
+MONTHS_ORDER = {
+    "january": 1, "february": 2, "march": 3, "april": 4,
+    "may": 5, "june": 6, "july": 7, "august": 8,
+    "september": 9, "october": 10, "november": 11, "december": 12,
+}
+SHORT_MONTHS = {
+    1: "JAN", 2: "FEB", 3: "MAR", 4: "APR", 5: "MAY", 6: "JUN",
+    7: "JUL", 8: "AUG", 9: "SEPT", 10: "OCT", 11: "NOV", 12: "DEC",
+}
+# Full JAN–DEC column labels for the summary tables.
+MONTH_LABELS = tuple(SHORT_MONTHS[i] for i in range(1, 13))
+
+# Previous Forecast tab: month names/abbreviations → number → column key.
+_PREV_MONTH_NUM = {
+    **MONTHS_ORDER,
+    **{name[:3]: num for name, num in MONTHS_ORDER.items()},
+    "sept": 9,
+}
+_PREV_MONTH_ABBR = {
+    1: "JAN", 2: "FEB", 3: "MAR", 4: "APR", 5: "MAY", 6: "JUN",
+    7: "JUL", 8: "AUG", 9: "SEP", 10: "OCT", 11: "NOV", 12: "DEC",
+}
+
+# Forecast CSV upload: band-format month headers (first three letters) and
+# the wide-format month columns with the header spellings accepted for each.
+_CSV_BAND_MONTHS = {name[:3].upper(): name for name in MONTH_NAMES}
+_CSV_WIDE_MONTH_COLUMNS = (
+    ("January", ("JAN", "Jan", "January")),
+    ("February", ("FEB", "Feb", "February")),
+    ("March", ("MAR", "Mar", "March")),
+    ("April", ("APR", "Apr", "April")),
+    ("May", ("MAY", "May")),
+    ("June", ("JUN", "Jun", "June")),
+    ("July", ("JUL", "Jul", "July")),
+    ("August", ("AUG", "Aug", "August")),
+    ("September", ("SEP", "Sept", "SEPT", "September")),
+    ("October", ("OCT", "Oct", "October")),
+    ("November", ("NOV", "Nov", "November")),
+    ("December", ("DEC", "Dec", "December")),
+)
+
+
+@lru_cache(maxsize=1024)
+def _parse_date_str(date_str):
+    """Parse 'Month-YYYY' → (year:int, month_int:int, label:str) or None."""
+    date_str = (date_str or "").strip()
+    if not date_str:
+        return None
+    parts = date_str.split("-")
+    if len(parts) < 2:
+        return None
+    month_name = parts[0].strip().lower()
+    try:
+        year = int(parts[-1].strip())
+    except ValueError:
+        return None
+    month_int = MONTHS_ORDER.get(month_name)
+    if not month_int:
+        return None
+    label = SHORT_MONTHS[month_int]
+    return year, month_int, label
+
+
 def _build_forecast_summary(fsq: str = "", fsq_customer: str = ""):
     """
     Build data for the Forecast Summary tab.
@@ -257,19 +493,6 @@ def _build_forecast_summary(fsq: str = "", fsq_customer: str = ""):
       - fs_prev_year, fs_fore_year: year labels for headers.
       - fs_customers: distinct customer names for filter dropdown.
     """
-    from datetime import date
-    import calendar
-
-    MONTHS_ORDER = {
-        "january": 1, "february": 2, "march": 3, "april": 4,
-        "may": 5, "june": 6, "july": 7, "august": 8,
-        "september": 9, "october": 10, "november": 11, "december": 12,
-    }
-    SHORT_MONTHS = {
-        1: "JAN", 2: "FEB", 3: "MAR", 4: "APR", 5: "MAY", 6: "JUN",
-        7: "JUL", 8: "AUG", 9: "SEPT", 10: "OCT", 11: "NOV", 12: "DEC",
-    }
-
     today = date.today()
     current_year = today.year
     prev_year = current_year - 1
@@ -292,25 +515,6 @@ def _build_forecast_summary(fsq: str = "", fsq_customer: str = ""):
     prev_month_keys = set()   # (year, month_int, label)
     fore_month_keys = set()
 
-    def _parse_date_str(date_str):
-        """Parse 'Month-YYYY' → (year:int, month_int:int, label:str) or None."""
-        date_str = (date_str or "").strip()
-        if not date_str:
-            return None
-        parts = date_str.split("-")
-        if len(parts) < 2:
-            return None
-        month_name = parts[0].strip().lower()
-        try:
-            year = int(parts[-1].strip())
-        except ValueError:
-            return None
-        month_int = MONTHS_ORDER.get(month_name)
-        if not month_int:
-            return None
-        label = SHORT_MONTHS[month_int]
-        return year, month_int, label
-
     # ── aggregate by (customer, part_number) so prev/fore share one row ─────
     rows_by_key = {}
 
@@ -372,7 +576,7 @@ def _build_forecast_summary(fsq: str = "", fsq_customer: str = ""):
     fs_rows = list(rows_by_key.values())
 
     # ── build ordered month label lists (always full JAN–DEC) ───────────────
-    all_month_labels = [SHORT_MONTHS[i] for i in range(1, 13)]
+    all_month_labels = MONTH_LABELS
 
     # We still evaluate used labels to preserve behaviour if needed later,
     # but the context always exposes the full 12 months.
@@ -426,36 +630,6 @@ def _build_actual_summary(adq: str = "", ad_customer: str = ""):
     Uses the same row structure as the Forecast Summary tab but reads
     \"actual_quantity\" from each monthly_forecasts entry.
     """
-    from datetime import date
-
-    MONTHS_ORDER = {
-        "january": 1, "february": 2, "march": 3, "april": 4,
-        "may": 5, "june": 6, "july": 7, "august": 8,
-        "september": 9, "october": 10, "november": 11, "december": 12,
-    }
-    SHORT_MONTHS = {
-        1: "JAN", 2: "FEB", 3: "MAR", 4: "APR", 5: "MAY", 6: "JUN",
-        7: "JUL", 8: "AUG", 9: "SEPT", 10: "OCT", 11: "NOV", 12: "DEC",
-    }
-
-    def _parse_date_str(date_str):
-        date_str = (date_str or "").strip()
-        if not date_str:
-            return None
-        parts = date_str.split("-")
-        if len(parts) < 2:
-            return None
-        month_name = parts[0].strip().lower()
-        try:
-            year = int(parts[-1].strip())
-        except ValueError:
-            return None
-        month_int = MONTHS_ORDER.get(month_name)
-        if not month_int:
-            return None
-        label = SHORT_MONTHS[month_int]
-        return year, month_int, label
-
     today = date.today()
     current_year = today.year
 
@@ -530,12 +704,10 @@ def _build_actual_summary(adq: str = "", ad_customer: str = ""):
     ad_rows = list(rows_by_key.values())
 
     # Always expose full JAN–DEC for consistency
-    ad_months = [SHORT_MONTHS[i] for i in range(1, 13)]
+    ad_months = MONTH_LABELS
 
-    from collections import defaultdict as _dd
-
-    ad_total_qty = _dd(float)
-    ad_total_amt = _dd(float)
+    ad_total_qty = defaultdict(float)
+    ad_total_amt = defaultdict(float)
 
     for row in ad_rows:
         up = row["unit_price"]
@@ -565,887 +737,884 @@ def _build_actual_summary(adq: str = "", ad_customer: str = ""):
         "ad_customers": ad_customers,
     }
 
-@never_cache
-@login_required
-@user_passes_test(is_admin)
-def admin_dashboard(request):
-    tab = (request.GET.get("tab") or "customers").strip().lower()
+def _handle_add_customer_full(request):
+    customer_name = _normalize_space(request.POST.get("customer_name"))
+    part_code = _normalize_space(request.POST.get("part_code"))
+    part_name = _normalize_space(request.POST.get("part_name"))
+    tep_code = _normalize_space(request.POST.get("tep_code"))
 
-    if request.method == "POST":
-        action = (request.POST.get("action") or "").strip()
+    mat_partcode = _normalize_space(request.POST.get("mat_partcode"))
+    dim_qty_raw = (request.POST.get("dim_qty") or "").strip()
+    loss_raw = (request.POST.get("loss_percent") or "").strip()
 
-        if action == "add_customer_full":
-            customer_name = _normalize_space(request.POST.get("customer_name"))
-            part_code = _normalize_space(request.POST.get("part_code"))
-            part_name = _normalize_space(request.POST.get("part_name"))
-            tep_code = _normalize_space(request.POST.get("tep_code"))
+    if not customer_name:
+        messages.error(request, "Customer Name is required.")
+        return redirect(_dashboard_tab_url("customers"))
 
-            mat_partcode = _normalize_space(request.POST.get("mat_partcode"))
-            dim_qty_raw = (request.POST.get("dim_qty") or "").strip()
-            loss_raw = (request.POST.get("loss_percent") or "").strip()
+    if not part_code:
+        messages.error(request, "Partcode is required.")
+        return redirect(_dashboard_tab_url("customers"))
 
-            if not customer_name:
-                messages.error(request, "Customer Name is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=customers")
+    if not part_name:
+        messages.error(request, "Partname is required.")
+        return redirect(_dashboard_tab_url("customers"))
 
-            if not part_code:
-                messages.error(request, "Partcode is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=customers")
+    if not tep_code:
+        messages.error(request, "TEP Code is required.")
+        return redirect(_dashboard_tab_url("customers"))
 
-            if not part_name:
-                messages.error(request, "Partname is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=customers")
+    if not mat_partcode:
+        messages.error(request, "Material Partcode is required.")
+        return redirect(_dashboard_tab_url("customers"))
 
-            if not tep_code:
-                messages.error(request, "TEP Code is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=customers")
+    if not dim_qty_raw:
+        messages.error(request, "Dim Qty is required.")
+        return redirect(_dashboard_tab_url("customers"))
 
-            if not mat_partcode:
-                messages.error(request, "Material Partcode is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=customers")
+    try:
+        dim_qty = float(dim_qty_raw)
+    except Exception:
+        messages.error(request, "Dim Qty must be a number.")
+        return redirect(_dashboard_tab_url("customers"))
 
-            if not dim_qty_raw:
-                messages.error(request, "Dim Qty is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=customers")
+    loss_percent = 10.0
+    if loss_raw != "":
+        try:
+            loss_percent = float(loss_raw)
+        except Exception:
+            messages.error(request, "Loss % must be a number.")
+            return redirect(_dashboard_tab_url("customers"))
 
-            try:
-                dim_qty = float(dim_qty_raw)
-            except Exception:
-                messages.error(request, "Dim Qty must be a number.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=customers")
+    master = MaterialList.objects.filter(mat_partcode=mat_partcode).first()
+    if not master:
+        messages.error(request, f"mat_partcode not found in master list: {mat_partcode}")
+        return redirect(_dashboard_tab_url("customers"))
 
-            loss_percent = 10.0
-            if loss_raw != "":
-                try:
-                    loss_percent = float(loss_raw)
-                except Exception:
-                    messages.error(request, "Loss % must be a number.")
-                    return redirect(reverse("app:admin_dashboard") + "?tab=customers")
+    total = round(float(dim_qty) * (1 + (float(loss_percent) / 100.0)), 4)
 
-            master = MaterialList.objects.filter(mat_partcode=mat_partcode).first()
-            if not master:
-                messages.error(request, f"mat_partcode not found in master list: {mat_partcode}")
-                return redirect(reverse("app:admin_dashboard") + "?tab=customers")
+    try:
+        with transaction.atomic():
+            # Lock the customer row so concurrent saves for the same customer
+            # can't both pass the material-exists check below.
+            customer, _ = Customer.objects.select_for_update().get_or_create(customer_name=customer_name)
 
-            total = round(float(dim_qty) * (1 + (float(loss_percent) / 100.0)), 4)
+            _ensure_customer_part_entry(customer, part_code, part_name)
 
-            try:
-                with transaction.atomic():
-                    customer, _ = Customer.objects.get_or_create(customer_name=customer_name)
+            tep, _ = TEPCode.objects.get_or_create(
+                customer=customer,
+                part_code=part_code,
+                tep_code=tep_code,
+            )
+
+            final_name = _allocate_material_name(
+                tep=tep,
+                base_name=master.mat_partname,
+                exclude_partcode=mat_partcode
+            )
 
-                    _ensure_customer_part_entry(customer, part_code, part_name)
+            material, created = Material.objects.get_or_create(
+                tep_code=tep,
+                mat_partcode=mat_partcode,
+                defaults={
+                    "mat_partname": final_name,
+                    "mat_maker": master.mat_maker,
+                    "unit": master.unit,
+                    "dim_qty": dim_qty,
+                    "loss_percent": loss_percent,
+                    "total": total,
+                }
+            )
 
-                    tep, _ = TEPCode.objects.get_or_create(
-                        customer=customer,
-                        part_code=part_code,
-                        tep_code=tep_code,
-                    )
+            if not created:
+                messages.error(request, f"Material already exists for TEP {tep_code} + {mat_partcode}.")
+                return redirect(_dashboard_tab_url("customers"))
 
-                    final_name = _allocate_material_name(
-                        tep=tep,
-                        base_name=master.mat_partname,
-                        exclude_partcode=mat_partcode
-                    )
+        messages.success(
+            request,
+            f"Saved: {customer_name} | {part_code} | {tep_code} | {mat_partcode}"
+        )
+    except Exception as e:
+        messages.error(request, f"Failed to save full customer record: {e}")
 
-                    material, created = Material.objects.get_or_create(
-                        tep_code=tep,
-                        mat_partcode=mat_partcode,
-                        defaults={
-                            "mat_partname": final_name,
-                            "mat_maker": master.mat_maker,
-                            "unit": master.unit,
-                            "dim_qty": dim_qty,
-                            "loss_percent": loss_percent,
-                            "total": total,
-                        }
-                    )
+    return redirect(_dashboard_tab_url("customers"))
 
-                    if not created:
-                        messages.error(request, f"Material already exists for TEP {tep_code} + {mat_partcode}.")
-                        return redirect(reverse("app:admin_dashboard") + "?tab=customers")
 
-                messages.success(
-                    request,
-                    f"Saved: {customer_name} | {part_code} | {tep_code} | {mat_partcode}"
-                )
-            except Exception as e:
-                messages.error(request, f"Failed to save full customer record: {e}")
+def _handle_add_material(request):
+    mat_partcode = (request.POST.get("mat_partcode") or "").strip()
+    mat_partname = (request.POST.get("mat_partname") or "").strip()
+    mat_maker = (request.POST.get("mat_maker") or "").strip()
+    unit = (request.POST.get("unit") or "").strip().lower()
 
-            return redirect(reverse("app:admin_dashboard") + "?tab=customers")
+    allowed_units = {"pc", "pcs", "m", "g", "kg"}
+    if unit not in allowed_units:
+        unit = "pc"
 
-        if action == "add_material":
-            mat_partcode = (request.POST.get("mat_partcode") or "").strip()
-            mat_partname = (request.POST.get("mat_partname") or "").strip()
-            mat_maker = (request.POST.get("mat_maker") or "").strip()
-            unit = (request.POST.get("unit") or "").strip().lower()
+    if not mat_partcode:
+        messages.error(request, "Part Code is required.")
+        return redirect(_dashboard_tab_url("materials"))
 
-            allowed_units = {"pc", "pcs", "m", "g", "kg"}
-            if unit not in allowed_units:
-                unit = "pc"
+    try:
+        obj, created = MaterialList.objects.get_or_create(
+            mat_partcode=mat_partcode,
+            defaults={
+                "mat_partname": mat_partname or mat_partcode,
+                "mat_maker": mat_maker or "Unknown",
+                "unit": unit,
+            }
+        )
 
-            if not mat_partcode:
-                messages.error(request, "Part Code is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=materials")
+        if created:
+            messages.success(request, f"Added material: {mat_partcode}")
+        else:
+            changed = False
+            if mat_partname and obj.mat_partname != mat_partname:
+                obj.mat_partname = mat_partname
+                changed = True
+            if mat_maker and obj.mat_maker != mat_maker:
+                obj.mat_maker = mat_maker
+                changed = True
+            if unit and obj.unit != unit:
+                obj.unit = unit
+                changed = True
 
-            try:
-                obj, created = MaterialList.objects.get_or_create(
-                    mat_partcode=mat_partcode,
-                    defaults={
-                        "mat_partname": mat_partname or mat_partcode,
-                        "mat_maker": mat_maker or "Unknown",
-                        "unit": unit,
-                    }
-                )
+            if changed:
+                obj.save()
+                messages.success(request, f"Updated material: {mat_partcode}")
+            else:
+                messages.info(request, f"No changes for: {mat_partcode}")
 
-                if created:
-                    messages.success(request, f"Added material: {mat_partcode}")
-                else:
-                    changed = False
-                    if mat_partname and obj.mat_partname != mat_partname:
-                        obj.mat_partname = mat_partname
-                        changed = True
-                    if mat_maker and obj.mat_maker != mat_maker:
-                        obj.mat_maker = mat_maker
-                        changed = True
-                    if unit and obj.unit != unit:
-                        obj.unit = unit
-                        changed = True
+    except Exception as e:
+        messages.error(request, f"Failed to save material: {e}")
 
-                    if changed:
-                        obj.save()
-                        messages.success(request, f"Updated material: {mat_partcode}")
-                    else:
-                        messages.info(request, f"No changes for: {mat_partcode}")
+    return redirect(_dashboard_tab_url("materials"))
 
-            except Exception as e:
-                messages.error(request, f"Failed to save material: {e}")
 
-            return redirect(reverse("app:admin_dashboard") + "?tab=materials")
+def _handle_update_material(request):
+    mat_id = (request.POST.get("mat_id") or "").strip()
+    mat_partcode = (request.POST.get("mat_partcode") or "").strip()
+    mat_partname = (request.POST.get("mat_partname") or "").strip()
+    mat_maker = (request.POST.get("mat_maker") or "").strip()
+    unit = (request.POST.get("unit") or "").strip().lower()
 
-        if action == "update_material":
-            mat_id = (request.POST.get("mat_id") or "").strip()
-            mat_partcode = (request.POST.get("mat_partcode") or "").strip()
-            mat_partname = (request.POST.get("mat_partname") or "").strip()
-            mat_maker = (request.POST.get("mat_maker") or "").strip()
-            unit = (request.POST.get("unit") or "").strip().lower()
+    allowed_units = {"pc", "pcs", "m", "g", "kg"}
+    if unit not in allowed_units:
+        unit = "pc"
 
-            allowed_units = {"pc", "pcs", "m", "g", "kg"}
-            if unit not in allowed_units:
-                unit = "pc"
+    if not mat_id:
+        messages.error(request, "Missing material ID.")
+        return redirect(_dashboard_tab_url("materials"))
 
-            if not mat_id:
-                messages.error(request, "Missing material ID.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=materials")
+    try:
+        obj = MaterialList.objects.get(id=mat_id)
 
-            try:
-                obj = MaterialList.objects.get(id=mat_id)
+        if not mat_partcode:
+            messages.error(request, "Part Code is required.")
+            return redirect(_dashboard_tab_url("materials"))
 
-                if not mat_partcode:
-                    messages.error(request, "Part Code is required.")
-                    return redirect(reverse("app:admin_dashboard") + "?tab=materials")
+        if mat_partcode != obj.mat_partcode:
+            if MaterialList.objects.filter(mat_partcode=mat_partcode).exclude(id=obj.id).exists():
+                messages.error(request, f"Part Code already exists: {mat_partcode}")
+                return redirect(_dashboard_tab_url("materials"))
 
-                if mat_partcode != obj.mat_partcode:
-                    if MaterialList.objects.filter(mat_partcode=mat_partcode).exclude(id=obj.id).exists():
-                        messages.error(request, f"Part Code already exists: {mat_partcode}")
-                        return redirect(reverse("app:admin_dashboard") + "?tab=materials")
+        obj.mat_partcode = mat_partcode
+        obj.mat_partname = mat_partname or mat_partcode
+        obj.mat_maker = mat_maker or "Unknown"
+        obj.unit = unit
+        obj.save()
 
-                obj.mat_partcode = mat_partcode
-                obj.mat_partname = mat_partname or mat_partcode
-                obj.mat_maker = mat_maker or "Unknown"
-                obj.unit = unit
-                obj.save()
+        messages.success(request, f"Saved changes: {obj.mat_partcode}")
 
-                messages.success(request, f"Saved changes: {obj.mat_partcode}")
+    except MaterialList.DoesNotExist:
+        messages.error(request, "Material not found.")
+    except Exception as e:
+        messages.error(request, f"Failed to update: {e}")
 
-            except MaterialList.DoesNotExist:
-                messages.error(request, "Material not found.")
-            except Exception as e:
-                messages.error(request, f"Failed to update: {e}")
+    return redirect(_dashboard_tab_url("materials"))
 
-            return redirect(reverse("app:admin_dashboard") + "?tab=materials")
 
-        if action == "add_forecast":
-            customer_name = _normalize_space(request.POST.get("customer_name"))
-            part_name = _normalize_space(request.POST.get("part_name"))
-            part_number = _normalize_space(request.POST.get("part_number"))
-            month = request.POST.get("month")
-            year = request.POST.get("year")
-            unit_price = request.POST.get("unit_price")
-            quantity = request.POST.get("quantity")
+def _handle_add_forecast(request):
+    customer_name = _normalize_space(request.POST.get("customer_name"))
+    part_name = _normalize_space(request.POST.get("part_name"))
+    part_number = _normalize_space(request.POST.get("part_number"))
+    month = request.POST.get("month")
+    year = request.POST.get("year")
+    unit_price = request.POST.get("unit_price")
+    quantity = request.POST.get("quantity")
 
-            if not customer_name:
-                messages.error(request, "Customer name is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
+    if not customer_name:
+        messages.error(request, "Customer name is required.")
+        return redirect(_dashboard_tab_url("forecast"))
 
-            if not part_name:
-                messages.error(request, "Part name is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
+    if not part_name:
+        messages.error(request, "Part name is required.")
+        return redirect(_dashboard_tab_url("forecast"))
 
-            if not part_number:
-                messages.error(request, "Part number is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
+    if not part_number:
+        messages.error(request, "Part number is required.")
+        return redirect(_dashboard_tab_url("forecast"))
 
-            if not month or not year:
-                messages.error(request, "Month and year are required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
+    if not month or not year:
+        messages.error(request, "Month and year are required.")
+        return redirect(_dashboard_tab_url("forecast"))
 
-            if not unit_price:
-                messages.error(request, "Unit price is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
+    if not unit_price:
+        messages.error(request, "Unit price is required.")
+        return redirect(_dashboard_tab_url("forecast"))
 
-            if not quantity:
-                messages.error(request, "Quantity is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
+    if not quantity:
+        messages.error(request, "Quantity is required.")
+        return redirect(_dashboard_tab_url("forecast"))
 
-            try:
-                unit_price = float(unit_price)
-                quantity = float(quantity)
-            except ValueError:
-                messages.error(request, "Unit price and quantity must be valid numbers.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
+    try:
+        unit_price = float(unit_price)
+        quantity = float(quantity)
+    except ValueError:
+        messages.error(request, "Unit price and quantity must be valid numbers.")
+        return redirect(_dashboard_tab_url("forecast"))
 
-            date_str = f"{month}-{year}"
+    date_str = f"{month}-{year}"
 
-            customer, created = Customer.objects.get_or_create(
-                customer_name=customer_name,
-                defaults={"parts": []}
+    customer, created = Customer.objects.get_or_create(
+        customer_name=customer_name,
+        defaults={"parts": []}
+    )
+
+    existing_forecast = Forecast.objects.filter(
+        customer=customer,
+        part_number=part_number
+    ).first()
+
+    # If a forecast for this part already exists for the customer,
+    # allow adding a new month as long as the (month, year) combo
+    # does not already exist in its monthly_forecasts.
+    if existing_forecast:
+        monthly = existing_forecast.monthly_forecasts or []
+
+        # Check for duplicate month/year
+        duplicate = any(
+            isinstance(m, dict) and str(m.get("date", "")).strip().lower() == date_str.lower()
+            for m in monthly
+        )
+
+        if duplicate:
+            messages.error(
+                request,
+                f"Forecast for part '{part_number}' already exists for {date_str} for this customer."
+            )
+            return redirect(
+                _dashboard_tab_url("forecast")
+                + ("&fq=" + request.GET.get("fq", "") if request.GET.get("fq") else "")
             )
 
-            existing_forecast = Forecast.objects.filter(
-                customer=customer,
-                part_number=part_number
-            ).first()
-
-            # If a forecast for this part already exists for the customer,
-            # allow adding a new month as long as the (month, year) combo
-            # does not already exist in its monthly_forecasts.
-            if existing_forecast:
-                monthly = existing_forecast.monthly_forecasts or []
-
-                # Check for duplicate month/year
-                duplicate = any(
-                    isinstance(m, dict) and str(m.get("date", "")).strip().lower() == date_str.lower()
-                    for m in monthly
-                )
+        # Append the new month entry to the existing forecast
+        monthly.append(
+            {
+                "date": date_str,
+                "unit_price": unit_price,
+                "quantity": quantity,
+            }
+        )
+        existing_forecast.monthly_forecasts = monthly
+        existing_forecast.part_name = part_name
+        existing_forecast.save()
+    else:
+        monthly_forecast = [
+            {
+                "date": date_str,
+                "unit_price": unit_price,
+                "quantity": quantity,
+            }
+        ]
 
-                if duplicate:
-                    messages.error(
-                        request,
-                        f"Forecast for part '{part_number}' already exists for {date_str} for this customer."
-                    )
-                    return redirect(
-                        reverse("app:admin_dashboard")
-                        + "?tab=forecast"
-                        + ("&fq=" + request.GET.get("fq", "") if request.GET.get("fq") else "")
-                    )
+        Forecast.objects.create(
+            customer=customer,
+            part_number=part_number,
+            part_name=part_name,
+            monthly_forecasts=monthly_forecast,
+        )
 
-                # Append the new month entry to the existing forecast
-                monthly.append(
-                    {
-                        "date": date_str,
-                        "unit_price": unit_price,
-                        "quantity": quantity,
-                    }
-                )
-                existing_forecast.monthly_forecasts = monthly
-                existing_forecast.part_name = part_name
-                existing_forecast.save()
-                forecast = existing_forecast
-            else:
-                monthly_forecast = [
-                    {
-                        "date": date_str,
-                        "unit_price": unit_price,
-                        "quantity": quantity,
-                    }
-                ]
+    _append_customer_part(customer, {"Partcode": part_number, "Partname": part_name})
 
-                forecast = Forecast.objects.create(
-                    customer=customer,
-                    part_number=part_number,
-                    part_name=part_name,
-                    monthly_forecasts=monthly_forecast,
-                )
+    messages.success(request, f"Forecast added successfully for {customer_name} - {part_number}")
+    return redirect(_dashboard_tab_url("forecast") + ("&fq=" + request.GET.get("fq", "") if request.GET.get("fq") else ""))
 
-            customer_parts = customer.parts or []
-            part_exists = any(
-                isinstance(p, dict) and str(p.get("Partcode", "")).strip() == part_number
-                for p in customer_parts
-            )
-            if not part_exists:
-                customer_parts.append({"Partcode": part_number, "Partname": part_name})
-                customer.parts = customer_parts
-                customer.save()
-
-            messages.success(request, f"Forecast added successfully for {customer_name} - {part_number}")
-            return redirect(reverse("app:admin_dashboard") + "?tab=forecast" + ("&fq=" + request.GET.get("fq", "") if request.GET.get("fq") else ""))
-
-        if action == "add_actual_delivered":
-            customer_name = _normalize_space(request.POST.get("customer_name"))
-            part_name = _normalize_space(request.POST.get("part_name"))
-            part_number = _normalize_space(request.POST.get("part_number"))
-            month = request.POST.get("month")
-            year = request.POST.get("year")
-            quantity = request.POST.get("actual_quantity")
-
-            if not customer_name:
-                messages.error(request, "Customer name is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=actual_delivered")
-
-            if not part_name:
-                messages.error(request, "Part name is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=actual_delivered")
-
-            if not part_number:
-                messages.error(request, "Part number is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=actual_delivered")
-
-            if not month or not year:
-                messages.error(request, "Month and year are required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=actual_delivered")
-
-            if not quantity:
-                messages.error(request, "Actual delivered quantity is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=actual_delivered")
 
-            try:
-                quantity_val = float(quantity)
-            except ValueError:
-                messages.error(request, "Actual delivered quantity must be a valid number.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=actual_delivered")
+def _handle_add_actual_delivered(request):
+    customer_name = _normalize_space(request.POST.get("customer_name"))
+    part_name = _normalize_space(request.POST.get("part_name"))
+    part_number = _normalize_space(request.POST.get("part_number"))
+    month = request.POST.get("month")
+    year = request.POST.get("year")
+    quantity = request.POST.get("actual_quantity")
 
-            date_str = f"{month}-{year}"
+    if not customer_name:
+        messages.error(request, "Customer name is required.")
+        return redirect(_dashboard_tab_url("actual_delivered"))
 
-            try:
-                customer = Customer.objects.get(customer_name=customer_name)
-            except Customer.DoesNotExist:
-                messages.error(request, "Customer not found. Please create a forecast for this customer first.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
+    if not part_name:
+        messages.error(request, "Part name is required.")
+        return redirect(_dashboard_tab_url("actual_delivered"))
 
-            forecast = Forecast.objects.filter(
-                customer=customer,
-                part_number=part_number,
-            ).first()
+    if not part_number:
+        messages.error(request, "Part number is required.")
+        return redirect(_dashboard_tab_url("actual_delivered"))
 
-            if not forecast:
-                messages.error(
-                    request,
-                    "No forecast found for this part and customer. Please create a forecast before adding Actual Delivered."
-                )
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
+    if not month or not year:
+        messages.error(request, "Month and year are required.")
+        return redirect(_dashboard_tab_url("actual_delivered"))
 
-            monthly = forecast.monthly_forecasts or []
-            matched = None
-            for entry in monthly:
-                if isinstance(entry, dict) and str(entry.get("date", "")).strip().lower() == date_str.lower():
-                    matched = entry
-                    break
-
-            if not matched:
-                unit_price = forecast.base_unit_price
-                matched = {
-                    "date": date_str,
-                    "unit_price": unit_price,
-                }
-                monthly.append(matched)
+    if not quantity:
+        messages.error(request, "Actual delivered quantity is required.")
+        return redirect(_dashboard_tab_url("actual_delivered"))
 
-            matched["actual_quantity"] = quantity_val
-            forecast.monthly_forecasts = monthly
-            forecast.part_name = part_name or forecast.part_name
-            forecast.save()
+    try:
+        quantity_val = float(quantity)
+    except ValueError:
+        messages.error(request, "Actual delivered quantity must be a valid number.")
+        return redirect(_dashboard_tab_url("actual_delivered"))
 
-            customer_parts = customer.parts or []
-            part_exists = any(
-                isinstance(p, dict) and str(p.get("Partcode", "")).strip() == part_number
-                for p in customer_parts
-            )
-            if not part_exists:
-                customer_parts.append({"Partcode": part_number, "Partname": part_name})
-                customer.parts = customer_parts
-                customer.save()
+    date_str = f"{month}-{year}"
 
-            messages.success(
-                request,
-                f"Actual Delivered recorded for {customer_name} - {part_number} ({date_str})"
-            )
-            return redirect(reverse("app:admin_dashboard") + "?tab=actual_delivered")
-
-        if action == "update_forecast":
-            original_customer = _normalize_space(request.POST.get("original_customer_name"))
-            original_part_number = _normalize_space(request.POST.get("original_part_number"))
-            customer_name = _normalize_space(request.POST.get("customer_name"))
-            part_name = _normalize_space(request.POST.get("part_name"))
-            part_number = _normalize_space(request.POST.get("part_number"))
-            month = request.POST.get("month")
-            year = request.POST.get("year")
-            unit_price = request.POST.get("unit_price")
-            quantity = request.POST.get("quantity")
-            original_date = (request.POST.get("original_date") or "").strip()
-
-            if not original_customer or not original_part_number:
-                messages.error(request, "Original customer and part number are required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
-
-            if not customer_name:
-                messages.error(request, "Customer name is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
-
-            if not part_name:
-                messages.error(request, "Part name is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
-
-            if not part_number:
-                messages.error(request, "Part number is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
-
-            if not unit_price:
-                messages.error(request, "Unit price is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
-
-            if not quantity:
-                messages.error(request, "Quantity is required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
+    try:
+        customer = Customer.objects.get(customer_name=customer_name)
+    except Customer.DoesNotExist:
+        messages.error(request, "Customer not found. Please create a forecast for this customer first.")
+        return redirect(_dashboard_tab_url("forecast"))
+
+    forecast = Forecast.objects.filter(
+        customer=customer,
+        part_number=part_number,
+    ).first()
+
+    if not forecast:
+        messages.error(
+            request,
+            "No forecast found for this part and customer. Please create a forecast before adding Actual Delivered."
+        )
+        return redirect(_dashboard_tab_url("forecast"))
 
-            try:
-                unit_price = float(unit_price)
-                quantity = float(quantity)
-            except ValueError:
-                messages.error(request, "Unit price and quantity must be valid numbers.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
-
-            # Find the original customer
-            original_customer_obj = Customer.objects.filter(customer_name__iexact=original_customer).first()
-            if not original_customer_obj:
-                messages.error(request, f"Original customer '{original_customer}' not found.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
-
-            # Find the forecast to update
-            forecast = Forecast.objects.filter(
-                customer=original_customer_obj,
-                part_number=original_part_number
-            ).first()
-
-            if not forecast:
-                messages.error(request, f"Forecast not found for {original_customer} - {original_part_number}")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
-
-            # Handle customer change if needed
-            if customer_name != original_customer:
-                new_customer, created = Customer.objects.get_or_create(
-                    customer_name=customer_name,
-                    defaults={"parts": []}
-                )
-                forecast.customer = new_customer
-            else:
-                forecast.customer = original_customer_obj
+    monthly = forecast.monthly_forecasts or []
+    matched = None
+    for entry in monthly:
+        if isinstance(entry, dict) and str(entry.get("date", "")).strip().lower() == date_str.lower():
+            matched = entry
+            break
 
-            # Update basic fields
-            forecast.part_number = part_number
-            forecast.part_name = part_name
+    if not matched:
+        unit_price = forecast.base_unit_price
+        matched = {
+            "date": date_str,
+            "unit_price": unit_price,
+        }
+        monthly.append(matched)
 
-            # We always expect month/year for per‑month editing
-            if not month or not year:
-                messages.error(request, "Month and year are required to update a forecast.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
+    matched["actual_quantity"] = quantity_val
+    forecast.monthly_forecasts = monthly
+    forecast.part_name = part_name or forecast.part_name
+    forecast.save()
 
-            date_str = f"{month}-{year}"
+    customer_parts = customer.parts or []
+    part_exists = any(
+        isinstance(p, dict) and str(p.get("Partcode", "")).strip() == part_number
+        for p in customer_parts
+    )
+    if not part_exists:
+        customer_parts.append({"Partcode": part_number, "Partname": part_name})
+        customer.parts = customer_parts
+        customer.save()
+
+    messages.success(
+        request,
+        f"Actual Delivered recorded for {customer_name} - {part_number} ({date_str})"
+    )
+    return redirect(_dashboard_tab_url("actual_delivered"))
 
-            # Update only the targeted monthly entry (identified by original_date)
-            monthly_list = list(forecast.monthly_forecasts or [])
-            updated = False
-            original_date_normalized = original_date.lower()
 
-            for entry in monthly_list:
-                if not isinstance(entry, dict):
-                    continue
-                existing_date = str(entry.get("date", "")).strip()
-                if original_date and existing_date.lower() == original_date_normalized:
-                    entry["date"] = date_str
-                    entry["unit_price"] = unit_price
-                    entry["quantity"] = quantity
-                    updated = True
-                    break
-
-            if not updated:
-                # If we didn't find the original month, append as a new one
-                monthly_list.append(
-                    {
-                        "date": date_str,
-                        "unit_price": unit_price,
-                        "quantity": quantity,
-                    }
-                )
+def _handle_update_forecast(request):
+    original_customer = _normalize_space(request.POST.get("original_customer_name"))
+    original_part_number = _normalize_space(request.POST.get("original_part_number"))
+    customer_name = _normalize_space(request.POST.get("customer_name"))
+    part_name = _normalize_space(request.POST.get("part_name"))
+    part_number = _normalize_space(request.POST.get("part_number"))
+    month = request.POST.get("month")
+    year = request.POST.get("year")
+    unit_price = request.POST.get("unit_price")
+    quantity = request.POST.get("quantity")
+    original_date = (request.POST.get("original_date") or "").strip()
 
-            # Prevent duplicate month/year entries for the same forecast
-            seen_dates = set()
-            deduped = []
-            for entry in monthly_list:
-                if not isinstance(entry, dict):
-                    continue
-                d = str(entry.get("date", "")).strip()
-                key = d.lower()
-                if key and key not in seen_dates:
-                    seen_dates.add(key)
-                    deduped.append(entry)
-
-            forecast.monthly_forecasts = deduped
-
-            # Save the forecast
-            forecast.save()
-
-            # Update customer.parts for both old and new customers
-            if customer_name != original_customer:
-                # Remove from old customer's parts if no other forecasts use it
-                other_forecasts = Forecast.objects.filter(
-                    customer=original_customer_obj,
-                    part_number=original_part_number
-                ).exclude(id=forecast.id).exists()
-                
-                if not other_forecasts:
-                    old_parts = original_customer_obj.parts or []
-                    updated_parts = [
-                        p for p in old_parts 
-                        if not (isinstance(p, dict) and str(p.get("Partcode", "")).strip() == original_part_number)
-                    ]
-                    original_customer_obj.parts = updated_parts
-                    original_customer_obj.save()
-                
-                # Add to new customer's parts
-                new_customer = forecast.customer
-                new_parts = new_customer.parts or []
-                part_exists = any(
-                    isinstance(p, dict) and str(p.get("Partcode", "")).strip() == part_number
-                    for p in new_parts
-                )
-                if not part_exists:
-                    new_parts.append({"Partcode": part_number, "Partname": part_name})
-                    new_customer.parts = new_parts
-                    new_customer.save()
-            else:
-                # Update part in same customer's parts if needed
-                if part_number != original_part_number:
-                    # Remove old part
-                    old_parts = original_customer_obj.parts or []
-                    updated_parts = [
-                        p for p in old_parts 
-                        if not (isinstance(p, dict) and str(p.get("Partcode", "")).strip() == original_part_number)
-                    ]
-                    
-                    # Add new part if not exists
-                    part_exists = any(
-                        isinstance(p, dict) and str(p.get("Partcode", "")).strip() == part_number
-                        for p in updated_parts
-                    )
-                    if not part_exists:
-                        updated_parts.append({"Partcode": part_number, "Partname": part_name})
-                    
-                    original_customer_obj.parts = updated_parts
-                    original_customer_obj.save()
+    if not original_customer or not original_part_number:
+        messages.error(request, "Original customer and part number are required.")
+        return redirect(_dashboard_tab_url("forecast"))
 
-            messages.success(request, f"Forecast updated successfully for {customer_name} - {part_number}")
-            return redirect(reverse("app:admin_dashboard") + "?tab=forecast" + ("&fq=" + request.GET.get("fq", "") if request.GET.get("fq") else ""))
-        
-        if action == "delete_forecast":
-            customer_name = _normalize_space(request.POST.get("customer_name"))
-            part_number = _normalize_space(request.POST.get("part_number"))
-            forecast_id = (request.POST.get("forecast_id") or "").strip()
-            date_str = (request.POST.get("date") or "").strip()
-
-            if not customer_name or not part_number:
-                messages.error(request, "Customer name and part number are required.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
-
-            # Find the customer
-            customer = Customer.objects.filter(customer_name__iexact=customer_name).first()
-            if not customer:
-                messages.error(request, f"Customer '{customer_name}' not found.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
-
-            # If a specific forecast id and date are provided, delete only that month
-            if forecast_id and date_str:
-                forecast = Forecast.objects.filter(
-                    id=forecast_id,
-                    customer=customer,
-                    part_number=part_number,
-                ).first()
-
-                if not forecast:
-                    messages.error(request, f"Forecast not found for {customer_name} - {part_number}")
-                    return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
-
-                monthly_list = list(forecast.monthly_forecasts or [])
-                target = date_str.strip().lower()
-                new_monthly = [
-                    m
-                    for m in monthly_list
-                    if not (
-                        isinstance(m, dict)
-                        and str(m.get("date", "")).strip().lower() == target
-                    )
-                ]
+    if not customer_name:
+        messages.error(request, "Customer name is required.")
+        return redirect(_dashboard_tab_url("forecast"))
 
-                if not new_monthly:
-                    # No more months left → delete the whole forecast
-                    forecast.delete()
-                else:
-                    forecast.monthly_forecasts = new_monthly
-                    forecast.save()
-
-                # If no other forecasts remain for this part, clean up customer.parts
-                other_forecasts = Forecast.objects.filter(
-                    customer=customer,
-                    part_number=part_number,
-                ).exists()
-
-                if not other_forecasts:
-                    customer_parts = customer.parts or []
-                    updated_parts = [
-                        p
-                        for p in customer_parts
-                        if not (
-                            isinstance(p, dict)
-                            and str(p.get("Partcode", "")).strip() == part_number
-                        )
-                    ]
-                    customer.parts = updated_parts
-                    customer.save()
+    if not part_name:
+        messages.error(request, "Part name is required.")
+        return redirect(_dashboard_tab_url("forecast"))
 
-                messages.success(
-                    request,
-                    f"Forecast month deleted successfully: {customer_name} - {part_number} ({date_str})",
-                )
-                return redirect(
-                    reverse("app:admin_dashboard")
-                    + "?tab=forecast"
-                    + ("&fq=" + request.GET.get("fq", "") if request.GET.get("fq") else "")
-                )
+    if not part_number:
+        messages.error(request, "Part number is required.")
+        return redirect(_dashboard_tab_url("forecast"))
 
-            # Fallback: delete all forecasts for this customer/part if no specific month given
-            forecasts_qs = Forecast.objects.filter(
-                customer=customer,
-                part_number=part_number
-            )
+    if not unit_price:
+        messages.error(request, "Unit price is required.")
+        return redirect(_dashboard_tab_url("forecast"))
 
-            if not forecasts_qs.exists():
-                messages.error(request, f"Forecast not found for {customer_name} - {part_number}")
-                return redirect(reverse("app:admin_dashboard") + "?tab=forecast")
+    if not quantity:
+        messages.error(request, "Quantity is required.")
+        return redirect(_dashboard_tab_url("forecast"))
 
-            forecast_info = f"{customer_name} - {part_number}"
-            forecasts_qs.delete()
+    try:
+        unit_price = float(unit_price)
+        quantity = float(quantity)
+    except ValueError:
+        messages.error(request, "Unit price and quantity must be valid numbers.")
+        return redirect(_dashboard_tab_url("forecast"))
+
+    # Find the original customer
+    original_customer_obj = Customer.objects.filter(customer_name__iexact=original_customer).first()
+    if not original_customer_obj:
+        messages.error(request, f"Original customer '{original_customer}' not found.")
+        return redirect(_dashboard_tab_url("forecast"))
+
+    # Find the forecast to update
+    forecast = Forecast.objects.filter(
+        customer=original_customer_obj,
+        part_number=original_part_number
+    ).first()
+
+    if not forecast:
+        messages.error(request, f"Forecast not found for {original_customer} - {original_part_number}")
+        return redirect(_dashboard_tab_url("forecast"))
+
+    # Handle customer change if needed
+    if customer_name != original_customer:
+        new_customer, created = Customer.objects.get_or_create(
+            customer_name=customer_name,
+            defaults={"parts": []}
+        )
+        forecast.customer = new_customer
+    else:
+        forecast.customer = original_customer_obj
+
+    # Update basic fields
+    forecast.part_number = part_number
+    forecast.part_name = part_name
+
+    # We always expect month/year for per‑month editing
+    if not month or not year:
+        messages.error(request, "Month and year are required to update a forecast.")
+        return redirect(_dashboard_tab_url("forecast"))
+
+    date_str = f"{month}-{year}"
+
+    # Update only the targeted monthly entry (identified by original_date)
+    monthly_list = list(forecast.monthly_forecasts or [])
+    updated = False
+    original_date_normalized = original_date.lower()
+
+    for entry in monthly_list:
+        if not isinstance(entry, dict):
+            continue
+        existing_date = str(entry.get("date", "")).strip()
+        if original_date and existing_date.lower() == original_date_normalized:
+            entry["date"] = date_str
+            entry["unit_price"] = unit_price
+            entry["quantity"] = quantity
+            updated = True
+            break
 
-            other_forecasts = Forecast.objects.filter(
-                customer=customer,
-                part_number=part_number
-            ).exists()
-
-            if not other_forecasts:
-                customer_parts = customer.parts or []
-                updated_parts = [
-                    p for p in customer_parts 
-                    if not (isinstance(p, dict) and str(p.get("Partcode", "")).strip() == part_number)
-                ]
-                customer.parts = updated_parts
-                customer.save()
-
-            messages.success(request, f"Forecast deleted successfully: {forecast_info}")
-            return redirect(
-                reverse("app:admin_dashboard")
-                + "?tab=forecast"
-                + ("&fq=" + request.GET.get("fq", "") if request.GET.get("fq") else "")
+    if not updated:
+        # If we didn't find the original month, append as a new one
+        monthly_list.append(
+            {
+                "date": date_str,
+                "unit_price": unit_price,
+                "quantity": quantity,
+            }
+        )
+
+    # Prevent duplicate month/year entries for the same forecast
+    seen_dates = set()
+    deduped = []
+    for entry in monthly_list:
+        if not isinstance(entry, dict):
+            continue
+        d = str(entry.get("date", "")).strip()
+        key = d.lower()
+        if key and key not in seen_dates:
+            seen_dates.add(key)
+            deduped.append(entry)
+
+    forecast.monthly_forecasts = deduped
+
+    # Save the forecast
+    forecast.save()
+
+    # Update customer.parts for both old and new customers
+    if customer_name != original_customer:
+        # Remove from old customer's parts if no other forecasts use it
+        other_forecasts = Forecast.objects.filter(
+            customer=original_customer_obj,
+            part_number=original_part_number
+        ).exclude(id=forecast.id).exists()
+
+        if not other_forecasts:
+            _remove_customer_part(original_customer_obj, original_part_number)
+
+        # Add to new customer's parts
+        _append_customer_part(forecast.customer, {"Partcode": part_number, "Partname": part_name})
+    else:
+        # Update part in same customer's parts if needed
+        if part_number != original_part_number:
+            _remove_customer_part(original_customer_obj, original_part_number)
+            _append_customer_part(original_customer_obj, {"Partcode": part_number, "Partname": part_name})
+
+    messages.success(request, f"Forecast updated successfully for {customer_name} - {part_number}")
+    return redirect(_dashboard_tab_url("forecast") + ("&fq=" + request.GET.get("fq", "") if request.GET.get("fq") else ""))
+
+
+def _handle_delete_forecast(request):
+    customer_name = _normalize_space(request.POST.get("customer_name"))
+    part_number = _normalize_space(request.POST.get("part_number"))
+    forecast_id = (request.POST.get("forecast_id") or "").strip()
+    date_str = (request.POST.get("date") or "").strip()
+
+    if not customer_name or not part_number:
+        messages.error(request, "Customer name and part number are required.")
+        return redirect(_dashboard_tab_url("forecast"))
+
+    # Find the customer
+    customer = Customer.objects.filter(customer_name__iexact=customer_name).first()
+    if not customer:
+        messages.error(request, f"Customer '{customer_name}' not found.")
+        return redirect(_dashboard_tab_url("forecast"))
+
+    # If a specific forecast id and date are provided, delete only that month
+    if forecast_id and date_str:
+        forecast = Forecast.objects.filter(
+            id=forecast_id,
+            customer=customer,
+            part_number=part_number,
+        ).only("id", "monthly_forecasts", "updated_at").first()
+
+        if not forecast:
+            messages.error(request, f"Forecast not found for {customer_name} - {part_number}")
+            return redirect(_dashboard_tab_url("forecast"))
+
+        monthly_list = list(forecast.monthly_forecasts or [])
+        target = date_str.strip().lower()
+        new_monthly = [
+            m
+            for m in monthly_list
+            if not (
+                isinstance(m, dict)
+                and str(m.get("date", "")).strip().lower() == target
             )
+        ]
 
-        if action == "toggle_user_admin":
-            user_id = (request.POST.get("user_id") or "").strip()
-            if not user_id:
-                messages.error(request, "Missing user ID.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=users")
+        if not new_monthly:
+            # No more months left → delete the whole forecast
+            forecast.delete()
+            drop_dashboard_counts(Forecast)
+        else:
+            forecast.monthly_forecasts = new_monthly
+            forecast.save(update_fields=["monthly_forecasts", "updated_at"])
 
-            try:
-                u = User.objects.get(id=user_id)
+        # If no other forecasts remain for this part, clean up customer.parts
+        other_forecasts = Forecast.objects.filter(
+            customer=customer,
+            part_number=part_number,
+        ).exists()
 
-                if u.id == request.user.id:
-                    messages.error(request, "You can't change your own admin role here.")
-                    return redirect(reverse("app:admin_dashboard") + "?tab=users")
+        if not other_forecasts:
+            _remove_customer_part(customer, part_number)
 
-                if u.is_superuser:
-                    u.is_superuser = False
-                    u.is_staff = True
-                    u.save(update_fields=["is_superuser", "is_staff"])
-                    messages.success(request, f"{u.username} is now Staff.")
-                else:
-                    u.is_superuser = True
-                    u.is_staff = True
-                    u.save(update_fields=["is_superuser", "is_staff"])
-                    messages.success(request, f"{u.username} is now Admin.")
+        messages.success(
+            request,
+            f"Forecast month deleted successfully: {customer_name} - {part_number} ({date_str})",
+        )
+        return redirect(
+            _dashboard_tab_url("forecast")
+            + ("&fq=" + request.GET.get("fq", "") if request.GET.get("fq") else "")
+        )
 
-            except User.DoesNotExist:
-                messages.error(request, "User not found.")
-            except Exception as e:
-                messages.error(request, f"Failed to update role: {e}")
+    # Fallback: delete all forecasts for this customer/part if no specific month given
+    forecasts_qs = Forecast.objects.filter(
+        customer=customer,
+        part_number=part_number
+    )
 
-            return redirect(reverse("app:admin_dashboard") + "?tab=users")
+    if not forecasts_qs.exists():
+        messages.error(request, f"Forecast not found for {customer_name} - {part_number}")
+        return redirect(_dashboard_tab_url("forecast"))
 
-        if action == "remove_staff":
-            user_id = (request.POST.get("user_id") or "").strip()
-            if not user_id:
-                messages.error(request, "Missing user ID.")
-                return redirect(reverse("app:admin_dashboard") + "?tab=users")
+    forecast_info = f"{customer_name} - {part_number}"
+    forecasts_qs.delete()
+    drop_dashboard_counts(Forecast)
 
-            try:
-                u = User.objects.get(id=user_id)
+    other_forecasts = Forecast.objects.filter(
+        customer=customer,
+        part_number=part_number
+    ).exists()
 
-                if u.id == request.user.id:
-                    messages.error(request, "You can't delete your own account.")
-                    return redirect(reverse("app:admin_dashboard") + "?tab=users")
+    if not other_forecasts:
+        _remove_customer_part(customer, part_number)
+
+    messages.success(request, f"Forecast deleted successfully: {forecast_info}")
+    return redirect(
+        _dashboard_tab_url("forecast")
+        + ("&fq=" + request.GET.get("fq", "") if request.GET.get("fq") else "")
+    )
 
-                try:
-                    prof = getattr(u, "employeeprofile", None)
-                    if prof is not None:
-                        prof.delete()
-                except Exception:
-                    pass
 
-                username = u.username
-                u.delete()
-                messages.success(request, f"Deleted user: {username}")
+def _handle_toggle_user_admin(request):
+    user_id = (request.POST.get("user_id") or "").strip()
+    if not user_id:
+        messages.error(request, "Missing user ID.")
+        return redirect(_dashboard_tab_url("users"))
 
-            except User.DoesNotExist:
-                messages.error(request, "User not found.")
-            except Exception as e:
-                messages.error(request, f"Failed to delete user: {e}")
+    try:
+        u = User.objects.only("id", "username", "is_superuser", "is_staff").get(id=user_id)
+
+        if u.id == request.user.id:
+            messages.error(request, "You can't change your own admin role here.")
+            return redirect(_dashboard_tab_url("users"))
+
+        if u.is_superuser:
+            u.is_superuser = False
+            u.is_staff = True
+            u.save(update_fields=["is_superuser", "is_staff"])
+            messages.success(request, f"{u.username} is now Staff.")
+        else:
+            u.is_superuser = True
+            u.is_staff = True
+            u.save(update_fields=["is_superuser", "is_staff"])
+            messages.success(request, f"{u.username} is now Admin.")
+
+    except User.DoesNotExist:
+        messages.error(request, "User not found.")
+    except Exception as e:
+        messages.error(request, f"Failed to update role: {e}")
+
+    return redirect(_dashboard_tab_url("users"))
 
-            return redirect(reverse("app:admin_dashboard") + "?tab=users")
+
+def _handle_remove_staff(request):
+    user_id = (request.POST.get("user_id") or "").strip()
+    if not user_id:
+        messages.error(request, "Missing user ID.")
+        return redirect(_dashboard_tab_url("users"))
+
+    try:
+        u = User.objects.select_related("employeeprofile").get(id=user_id)
+
+        if u.id == request.user.id:
+            messages.error(request, "You can't delete your own account.")
+            return redirect(_dashboard_tab_url("users"))
+
+        try:
+            prof = getattr(u, "employeeprofile", None)
+            if prof is not None:
+                prof.delete()
+        except Exception:
+            pass
+
+        username = u.username
+        u.delete()
+        messages.success(request, f"Deleted user: {username}")
+
+    except User.DoesNotExist:
+        messages.error(request, "User not found.")
+    except Exception as e:
+        messages.error(request, f"Failed to delete user: {e}")
+
+    return redirect(_dashboard_tab_url("users"))
+
+
+_DASHBOARD_ACTIONS = {
+    "add_customer_full": _handle_add_customer_full,
+    "add_material": _handle_add_material,
+    "update_material": _handle_update_material,
+    "add_forecast": _handle_add_forecast,
+    "add_actual_delivered": _handle_add_actual_delivered,
+    "update_forecast": _handle_update_forecast,
+    "delete_forecast": _handle_delete_forecast,
+    "toggle_user_admin": _handle_toggle_user_admin,
+    "remove_staff": _handle_remove_staff,
+}
+
+
+@never_cache
+@login_required
+@user_passes_test(is_admin)
+def admin_dashboard(request):
+    tab = (request.GET.get("tab") or "customers").strip().lower()
+
+    if request.method == "POST":
+        action = (request.POST.get("action") or "").strip()
+
+        handler = _DASHBOARD_ACTIONS.get(action)
+        if handler is not None:
+            return handler(request)
 
     # ── GET: build context ────────────────────────────────────────────────────
 
-    q = (request.GET.get("q") or "").strip()
-    customers = build_customer_table(q)
+    # The TEP detail panel is a partial; it needs none of the tab data below.
+    tep_id = request.GET.get("tep_id")
+    is_ajax = request.headers.get("x-requested-with") == "XMLHttpRequest"
 
-    master_map = {
-        m["mat_partcode"]: {
-            "mat_partname": m["mat_partname"],
-            "mat_maker": m["mat_maker"],
-            "unit": m["unit"],
-        }
-        for m in MaterialList.objects.all().values("mat_partcode", "mat_partname", "mat_maker", "unit")
-    }
+    if tep_id and is_ajax:
+        tep = get_object_or_404(TEPCode.objects.select_related("customer"), id=tep_id)
+        # Plain row dicts are all the panel template reads; skip building
+        # Material instances for them.
+        materials = (
+            Material.objects
+            .filter(tep_code=tep)
+            .order_by("mat_partname")
+            .values("mat_partcode", "mat_partname", "mat_maker", "dim_qty", "unit", "loss_percent", "total")
+        )
 
-    mq = (request.GET.get("mq") or "").strip()
-    materials_qs = MaterialList.objects.all().order_by("mat_partcode")
-
-    if mq:
-        materials_qs = materials_qs.filter(
-            Q(mat_partcode__icontains=mq) |
-            Q(mat_partname__icontains=mq) |
-            Q(mat_maker__icontains=mq) |
-            Q(unit__icontains=mq)
+        selected_part = (tep.part_code or "").strip()
+        selected_part_name = tep.customer.parts_map.get(selected_part, "")
+
+        return render(request, "admin/_customer_detail_panel.html", {
+            "customer": tep.customer,
+            "materials": materials,
+            "selected_tep": tep.tep_code,
+            "selected_part": selected_part,
+            "selected_part_name": selected_part_name,
+            "tep_id": tep.id,
+        })
+
+    q = (request.GET.get("q") or "").strip()
+    # Each tab below only builds its data when it is the one being shown.
+    customers = []
+    if tab == "customers":
+        customers = build_customer_table(q)
+
+    # The master map and material list are only rendered on these tabs.
+    master_map_json = "{}"
+    if tab in ("customers", "materials"):
+        # Adding, editing or deleting a master material changes the count or
+        # the latest updated_at, so a cached map is never served stale.
+        stamp = MaterialList.objects.aggregate(n=Count("id"), latest=Max("updated_at"))
+        master_map_key = (
+            f"master-map-json:{stamp['n']}:"
+            f"{stamp['latest'].isoformat() if stamp['latest'] else ''}"
         )
+        # The serialised JSON is cached, so a hit skips the dumps as well.
+        master_map_json = cache.get(master_map_key)
+        if master_map_json is None:
+            master_map = {
+                m["mat_partcode"]: {
+                    "mat_partname": m["mat_partname"],
+                    "mat_maker": m["mat_maker"],
+                    "unit": m["unit"],
+                }
+                for m in (
+                    MaterialList.objects
+                    .values("mat_partcode", "mat_partname", "mat_maker", "unit")
+                    .iterator(chunk_size=2000)
+                )
+            }
+            master_map_json = json.dumps(master_map, ensure_ascii=False)
+            cache.set(master_map_key, master_map_json, 3600)
 
-    paginator = Paginator(materials_qs, 8)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    mq = (request.GET.get("mq") or "").strip()
+    page_obj = None
+    material_list = []
+    material_total = 0
+    if tab == "materials":
+        materials_qs = MaterialList.objects.all().order_by("mat_partcode")
+
+        if mq:
+            materials_qs = materials_qs.filter(
+                Q(mat_partcode__icontains=mq) |
+                Q(mat_partname__icontains=mq) |
+                Q(mat_maker__icontains=mq) |
+                Q(unit__icontains=mq)
+            )
 
-    material_total = materials_qs.count()
-    material_list = page_obj
+        paginator = Paginator(materials_qs, 8)
+        page_number = request.GET.get("page")
+        page_obj = paginator.get_page(page_number)
 
-    uq = (request.GET.get("uq") or "").strip()
-    users_qs = User.objects.all().order_by("-is_superuser", "-is_staff", "username")
+        material_total = paginator.count
+        material_list = page_obj
 
-    if uq:
-        users_qs = users_qs.filter(
-            Q(username__icontains=uq) |
-            Q(employeeprofile__full_name__icontains=uq) |
-            Q(employeeprofile__department__icontains=uq)
-        )
+    uq = (request.GET.get("uq") or "").strip()
+    users_page = None
+    user_total = 0
+    if tab == "users":
+        # The users table shows each profile's full_name and department.
+        users_qs = User.objects.select_related("employeeprofile").order_by("-is_superuser", "-is_staff", "username")
+
+        if uq:
+            users_qs = users_qs.filter(
+                Q(username__icontains=uq) |
+                Q(employeeprofile__full_name__icontains=uq) |
+                Q(employeeprofile__department__icontains=uq)
+            )
 
-    users_paginator = Paginator(users_qs, 10)
-    upage = request.GET.get("upage")
-    users_page = users_paginator.get_page(upage)
-    user_total = users_qs.count()
+        users_paginator = Paginator(users_qs, 10)
+        upage = request.GET.get("upage")
+        users_page = users_paginator.get_page(upage)
+        user_total = users_paginator.count
 
     # Current Forecast Tab Data
     fq = (request.GET.get("fq") or "").strip()
     fcustomer = (request.GET.get("fcustomer") or "").strip()
-    page_number = request.GET.get('page', 1)
-    
-    forecasts_qs = Forecast.objects.select_related("customer").order_by("-id")
+    forecasts_page = None
+    forecasts_total = 0
+    if tab == "forecast":
+        page_number = request.GET.get('page', 1)
     
-    if fq:
-        forecasts_qs = forecasts_qs.filter(
-            Q(part_number__icontains=fq)
-            | Q(part_name__icontains=fq)
-            | Q(customer__customer_name__icontains=fq)
+        # The listing only shows the customer's name, so don't pull its parts JSON.
+        forecasts_qs = (
+            Forecast.objects
+            .select_related("customer")
+            .only("id", "part_number", "part_name", "monthly_forecasts", "customer__customer_name")
+            .order_by("-id")
         )
     
-    if fcustomer:
-        forecasts_qs = forecasts_qs.filter(customer__customer_name=fcustomer)
-
-    # Get total count before pagination
-    forecasts_total = forecasts_qs.count()
+        if fq:
+            forecasts_qs = forecasts_qs.filter(
+                Q(part_number__icontains=fq)
+                | Q(part_name__icontains=fq)
+                | Q(customer__customer_name__icontains=fq)
+            )
     
-    # Create paginator with 8 items per page
-    paginator = Paginator(forecasts_qs, 8)
-    forecasts_page = paginator.get_page(page_number)
+        if fcustomer:
+            forecasts_qs = forecasts_qs.filter(customer__customer_name=fcustomer)
+
+        # Create paginator with 8 items per page
+        paginator = Paginator(forecasts_qs, 8)
+        forecasts_page = paginator.get_page(page_number)
+        forecasts_total = paginator.count
     
-    # Process the paginated forecasts
-    forecasts_list = []
-    for forecast in forecasts_page:
-        first_monthly = None
-        if forecast.monthly_forecasts and len(forecast.monthly_forecasts) > 0:
-            first_monthly = forecast.monthly_forecasts[0]
+        # Unit price and quantity shown for each forecast, from its first entry.
+        for forecast in forecasts_page:
+            first_monthly = (forecast.monthly_forecasts or [None])[0]
             if isinstance(first_monthly, dict):
-                first_monthly = {
-                    "date": first_monthly.get("date", ""),
-                    "unit_price": float(first_monthly.get("unit_price", 0)),
-                    "quantity": float(first_monthly.get("quantity", 0)),
-                }
-
-        forecast.unit_price_display = first_monthly.get("unit_price", 0) if first_monthly else 0
-        forecast.quantity_display = first_monthly.get("quantity", 0) if first_monthly else 0
-
-        forecasts_list.append(forecast)
-
-    forecasts_monthly_json = {}
-    for f in forecasts_list:
-        monthly_list = []
-        for m in (f.monthly_forecasts or []):
-            if isinstance(m, dict):
-                monthly_list.append({
-                    "date": m.get("date", ""),
-                    "unit_price": float(m.get("unit_price", 0)),
-                    "quantity": float(m.get("quantity", 0)),
-                })
-        forecasts_monthly_json[str(f.id)] = monthly_list
-
-    forecasts_monthly_json = json.dumps(forecasts_monthly_json, default=str)
+                forecast.unit_price_display = float(first_monthly.get("unit_price", 0))
+                forecast.quantity_display = float(first_monthly.get("quantity", 0))
+            else:
+                forecast.unit_price_display = 0
+                forecast.quantity_display = 0
 
     # ── Previous Forecast Tab Data (NEW) ─────────────────────────────────────
     pf_customer = (request.GET.get("pf_customer") or "").strip()
     pf_q = (request.GET.get("pf_q") or "").strip()
     
     # Get current and previous years
-    from datetime import date
     current_year = date.today().year
     previous_year = current_year - 1
     
     prev_data = {}
     if tab == "previous_forecast":
-        # Month mapping for display
-        month_map = {
-            1: 'JAN', 2: 'FEB', 3: 'MAR', 4: 'APR', 5: 'MAY', 6: 'JUN',
-            7: 'JUL', 8: 'AUG', 9: 'SEP', 10: 'OCT', 11: 'NOV', 12: 'DEC'
-        }
-        
-        # Month name to number mapping for parsing
-        month_name_to_num = {
-            'january': 1, 'february': 2, 'march': 3, 'april': 4,
-            'may': 5, 'june': 6, 'july': 7, 'august': 8,
-            'september': 9, 'october': 10, 'november': 11, 'december': 12,
-            'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4,
-            'jun': 6, 'jul': 7, 'aug': 8, 'sep': 9, 'sept': 9,
-            'oct': 10, 'nov': 11, 'dec': 12
-        }
-        
         # Get all forecasts
         qs = Forecast.objects.select_related("customer").all()
         
@@ -1515,11 +1684,11 @@ def admin_dashboard(request):
                     if year != previous_year:
                         continue
                     
-                    month_num = month_name_to_num.get(month_name)
+                    month_num = _PREV_MONTH_NUM.get(month_name)
                     if not month_num:
                         continue
                     
-                    month_abbr = month_map[month_num]
+                    month_abbr = _PREV_MONTH_ABBR[month_num]
                     
                     # Get quantity
                     try:
@@ -1581,39 +1750,15 @@ def admin_dashboard(request):
     if tab == "actual_delivered":
         ad_data = _build_actual_summary(adq=adq, ad_customer=ad_customer)
 
-    tep_id = request.GET.get("tep_id")
-    is_ajax = request.headers.get("x-requested-with") == "XMLHttpRequest"
-
-    if tep_id and is_ajax:
-        tep = get_object_or_404(TEPCode.objects.select_related("customer"), id=tep_id)
-        materials = Material.objects.filter(tep_code=tep).order_by("mat_partname")
-
-        selected_part = (tep.part_code or "").strip()
-        selected_part_name = ""
-
-        for p in (tep.customer.parts or []):
-            if isinstance(p, dict) and str(p.get("Partcode", "")).strip() == selected_part:
-                selected_part_name = str(p.get("Partname", "")).strip()
-                break
-
-        return render(request, "admin/_customer_detail_panel.html", {
-            "customer": tep.customer,
-            "materials": materials,
-            "selected_tep": tep.tep_code,
-            "selected_part": selected_part,
-            "selected_part_name": selected_part_name,
-            "tep_id": tep.id,
-        })
-
     # ── Build final context ───────────────────────────────────────────────────
     context = {
         "tab": tab,
 
-        "customers_count": Customer.objects.count(),
-        "tep_count": TEPCode.objects.count(),
-        "materials_count": Material.objects.count(),
-        "users_count": User.objects.count(),
-        "forecasts_count": Forecast.objects.count(),
+        "customers_count": _cached_model_count(Customer),
+        "tep_count": _cached_model_count(TEPCode),
+        "materials_count": _cached_model_count(Material),
+        "users_count": _cached_model_count(User),
+        "forecasts_count": _cached_model_count(Forecast),
 
         "customers": customers,
         "q": q,
@@ -1631,11 +1776,9 @@ def admin_dashboard(request):
         "fcustomer": fcustomer,
         "forecasts_list": forecasts_page,
         "forecasts_total": forecasts_total,
-        "forecasts_monthly_json": forecasts_monthly_json,
         "all_customers": Customer.objects.all().order_by("customer_name"),
-        "forecast_customers": Customer.objects.filter(forecasts__isnull=False).distinct().order_by("customer_name"),
 
-        "master_map_json": json.dumps(master_map, ensure_ascii=False),
+        "master_map_json": master_map_json,
 
         # Forecast Summary
         "fsq":         fsq,
@@ -1657,7 +1800,7 @@ def admin_dashboard(request):
 @login_required
 @user_passes_test(is_admin)
 def admin_users(request):
-    return redirect(reverse("app:admin_dashboard") + "?tab=users")
+    return redirect(_dashboard_tab_url("users"))
 
 
 @login_required
@@ -1667,13 +1810,13 @@ def toggle_user_active(request, user_id):
 
     if user_obj == request.user:
         messages.error(request, "You can't disable your own account.")
-        return redirect(reverse("app:admin_dashboard") + "?tab=users")
+        return redirect(_dashboard_tab_url("users"))
 
     user_obj.is_active = not user_obj.is_active
     user_obj.save(update_fields=["is_active"])
 
     messages.success(request, f"Updated user: {user_obj.username} (active={user_obj.is_active})")
-    return redirect(reverse("app:admin_dashboard") + "?tab=users")
+    return redirect(_dashboard_tab_url("users"))
 
 
 @login_required
@@ -1684,7 +1827,7 @@ def create_employee(request):
         if form.is_valid():
             form.save()
             messages.success(request, "Employee account created successfully.")
-            return redirect(reverse("app:admin_dashboard") + "?tab=users")
+            return redirect(_dashboard_tab_url("users"))
     else:
         form = EmployeeCreateForm()
 
@@ -1694,7 +1837,7 @@ def create_employee(request):
 @login_required
 @user_passes_test(is_admin)
 def admin_csv_upload(request):
-    default_next = reverse("app:admin_dashboard") + "?tab=materials"
+    default_next = _dashboard_tab_url("materials")
     next_url = request.POST.get("next") or request.GET.get("next") or default_next
 
     if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
@@ -1702,27 +1845,17 @@ def admin_csv_upload(request):
 
     if request.method == "POST" and request.FILES.get("csv_file"):
         f = request.FILES["csv_file"]
-        raw = f.read()
+        encoding = _sniff_csv_encoding(f.read(65536))
+        f.seek(0)
 
-        content = None
-        for enc in ("utf-8-sig", "utf-16", "cp1252", "latin-1"):
-            try:
-                content = raw.decode(enc)
-                break
-            except UnicodeDecodeError:
-                continue
-
-        if content is None:
+        if encoding is None:
             messages.error(request, "Could not read file encoding. Save as CSV UTF-8 and upload again.")
             return redirect(next_url)
 
-        csv_file = io.StringIO(content)
-        reader = csv.DictReader(csv_file)
-        reader.fieldnames = [h.strip().lstrip("\ufeff") for h in (reader.fieldnames or [])]
-
         master_inserted = 0
         master_updated = 0
         ALLOWED_UNITS = {"pc", "pcs", "m", "g", "kg"}
+        BATCH_SIZE = 1000
 
         def sget(row, *keys, default=""):
             for k in keys:
@@ -1731,45 +1864,103 @@ def admin_csv_upload(request):
                     return str(v).strip()
             return default
 
-        try:
+        def flush(rows):
+            nonlocal master_inserted, master_updated
+            # One lookup for every code in the batch, then a bulk insert
+            # and a bulk update instead of a get_or_create/save per row.
+            masters = MaterialList.objects.in_bulk(
+                {r[0] for r in rows}, field_name="mat_partcode"
+            )
+            new_masters = []
+            dirty_masters = {}
+
+            for mat_partcode, mat_partname, mat_maker, unit in rows:
+                master = masters.get(mat_partcode)
+
+                if master is None:
+                    master = MaterialList(
+                        mat_partcode=mat_partcode,
+                        mat_partname=mat_partname or mat_partcode,
+                        mat_maker=mat_maker or "Unknown",
+                        unit=unit,
+                    )
+                    masters[mat_partcode] = master
+                    new_masters.append(master)
+                    master_inserted += 1
+                else:
+                    changed = False
+                    if mat_partname and master.mat_partname != mat_partname:
+                        master.mat_partname = mat_partname
+                        changed = True
+                    if mat_maker and master.mat_maker != mat_maker:
+                        master.mat_maker = mat_maker
+                        changed = True
+                    if unit and master.unit != unit:
+                        master.unit = unit
+                        changed = True
+                    if changed:
+                        if master.pk:
+                            dirty_masters[master.pk] = master
+                        master_updated += 1
+
+            MaterialList.objects.bulk_create(new_masters, batch_size=BATCH_SIZE)
+            # bulk_update skips auto_now, so stamp the rows explicitly.
+            now = timezone.now()
+            for master in dirty_masters.values():
+                master.updated_at = now
+            MaterialList.objects.bulk_update(
+                list(dirty_masters.values()),
+                ["mat_partname", "mat_maker", "unit", "updated_at"],
+                batch_size=BATCH_SIZE,
+            )
+
+        def import_csv(csv_file):
+            nonlocal master_inserted, master_updated
+            master_inserted = master_updated = 0
+
             with transaction.atomic():
+                reader = csv.DictReader(csv_file)
+                reader.fieldnames = [h.strip().lstrip("\ufeff") for h in (reader.fieldnames or [])]
+
+                rows = []
                 for row in reader:
                     mat_partcode = sget(row, "mat_partcode", "material_part_code")
-                    mat_partname = sget(row, "mat_partname", "material_name")
-                    mat_maker = sget(row, "mat_maker", "maker")
-                    unit = sget(row, "unit", default="pc").lower()
-
-                    if unit not in ALLOWED_UNITS:
-                        unit = "pc"
-
                     if not mat_partcode:
                         continue
 
-                    master, created_master = MaterialList.objects.get_or_create(
-                        mat_partcode=mat_partcode,
-                        defaults={
-                            "mat_partname": mat_partname or mat_partcode,
-                            "mat_maker": mat_maker or "Unknown",
-                            "unit": unit,
-                        }
-                    )
+                    unit = sget(row, "unit", default="pc").lower()
+                    if unit not in ALLOWED_UNITS:
+                        unit = "pc"
 
-                    if created_master:
-                        master_inserted += 1
-                    else:
-                        changed = False
-                        if mat_partname and master.mat_partname != mat_partname:
-                            master.mat_partname = mat_partname
-                            changed = True
-                        if mat_maker and master.mat_maker != mat_maker:
-                            master.mat_maker = mat_maker
-                            changed = True
-                        if unit and master.unit != unit:
-                            master.unit = unit
-                            changed = True
-                        if changed:
-                            master.save()
-                            master_updated += 1
+                    rows.append((
+                        mat_partcode,
+                        sget(row, "mat_partname", "material_name"),
+                        sget(row, "mat_maker", "maker"),
+                        unit,
+                    ))
+                    if len(rows) >= BATCH_SIZE:
+                        flush(rows)
+                        rows = []
+
+                if rows:
+                    flush(rows)
+
+        # Parse straight off the upload instead of holding the raw bytes and
+        # a decoded copy in memory; rows are flushed in batches.
+        stream = io.TextIOWrapper(f.file, encoding=encoding, newline="")
+        try:
+            try:
+                import_csv(stream)
+            except UnicodeDecodeError:
+                # The sample decoded but a later part of the file doesn't (e.g.
+                # an ASCII head on a cp1252 export). The batches were rolled
+                # back, so decode the whole file instead and import again.
+                f.seek(0)
+                content = _decode_csv_bytes(f.read())
+                if content is None:
+                    messages.error(request, "Could not read file encoding. Save as CSV UTF-8 and upload again.")
+                    return redirect(next_url)
+                import_csv(io.StringIO(content))
 
             messages.success(
                 request,
@@ -1781,6 +1972,10 @@ def admin_csv_upload(request):
             messages.error(request, f"Upload failed: {e}")
             return redirect(next_url)
 
+        finally:
+            # Leave closing the upload to Django.
+            stream.detach()
+
     return redirect(next_url)
 
 
@@ -1805,7 +2000,7 @@ def admin_forecast_csv_upload(request):
     Forecast record whose monthly_forecasts list contains all months
     from the CSV.
     """
-    default_next = reverse("app:admin_dashboard") + "?tab=forecast"
+    default_next = _dashboard_tab_url("forecast")
     next_url = request.POST.get("next") or request.GET.get("next") or default_next
 
     if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
@@ -1815,13 +2010,7 @@ def admin_forecast_csv_upload(request):
         f = request.FILES["csv_file"]
         raw = f.read()
 
-        content = None
-        for enc in ("utf-8-sig", "utf-16", "cp1252", "latin-1"):
-            try:
-                content = raw.decode(enc)
-                break
-            except UnicodeDecodeError:
-                continue
+        content = _decode_csv_bytes(raw)
 
         if content is None:
             messages.error(request, "Could not read file encoding. Save as CSV UTF-8 and upload again.")
@@ -1865,15 +2054,13 @@ def admin_forecast_csv_upload(request):
                 non‑alphanumeric characters so that variants like
                 "PARTNUM", "Part Num", "part_number" etc. can all be matched.
                 """
-                import re as _re
-
                 normalized_targets = [n.lower() for n in names]
 
                 for idx, col in enumerate(header_cols):
                     raw = (col or "").strip().lower()
                     if not raw:
                         continue
-                    norm = _re.sub(r"[^a-z0-9]", "", raw)
+                    norm = _NON_ALNUM_RE.sub("", raw)
 
                     for target in normalized_targets:
                         if norm == target or norm.startswith(target) or target in norm:
@@ -1909,7 +2096,6 @@ def admin_forecast_csv_upload(request):
                 messages.error(request, "CSV header missing Customer / Part number / Part name.")
                 return redirect(next_url)
 
-            import re
             band_info = []
             # Excel often merges the band cell (e.g. "ACTUAL DELIVERED (2025)")
             # across many month columns, so in the CSV only the first column of
@@ -1919,22 +2105,6 @@ def admin_forecast_csv_upload(request):
             current_group = None
             current_year_from_band = None
 
-            month_map = {
-                "JAN": "January",
-                "FEB": "February",
-                "MAR": "March",
-                "APR": "April",
-                "MAY": "May",
-                "JUN": "June",
-                "JUL": "July",
-                "AUG": "August",
-                "SEP": "September",
-                "SEPT": "September",
-                "OCT": "October",
-                "NOV": "November",
-                "DEC": "December",
-            }
-
             for band_raw, col_raw in zip(header_band, header_cols):
                 band_label = (band_raw or "").strip().upper()
                 col_label = (col_raw or "").strip().upper()
@@ -1961,7 +2131,7 @@ def admin_forecast_csv_upload(request):
                     continue
 
                 key3 = col_label[:3]
-                month_full = month_map.get(key3)
+                month_full = _CSV_BAND_MONTHS.get(key3)
                 if not month_full:
                     band_info.append(None)
                     continue
@@ -1974,16 +2144,14 @@ def admin_forecast_csv_upload(request):
                     }
                 )
 
-            from datetime import date as _date_cls
             # For year handling we prefer the explicit year parsed from the
             # band label (e.g. "FORECAST (2026)"). If a particular band has no
             # year in its label, we fall back to sensible defaults based on
             # today's year.
-            _today_year = _date_cls.today().year
+            _today_year = date.today().year
 
             # Fallback customer name from file/sheet name when no column exists.
-            import os as _os_mod
-            default_customer_name = _os_mod.path.splitext(f.name)[0] or "Unknown Customer"
+            default_customer_name = os.path.splitext(f.name)[0] or "Unknown Customer"
 
             for row_vals in data_rows:
                 if len(row_vals) < len(header_cols):
@@ -2093,7 +2261,6 @@ def admin_forecast_csv_upload(request):
                     if month and year:
                         date_str = f"{month}-{year}"
                     elif month:
-                        from datetime import date
                         date_str = f"{month}-{date.today().year}"
 
                 if date_str and base_quantity:
@@ -2105,29 +2272,13 @@ def admin_forecast_csv_upload(request):
                         }
                     )
 
-                month_columns = [
-                    ("January", ["JAN", "Jan", "January"]),
-                    ("February", ["FEB", "Feb", "February"]),
-                    ("March", ["MAR", "Mar", "March"]),
-                    ("April", ["APR", "Apr", "April"]),
-                    ("May", ["MAY", "May"]),
-                    ("June", ["JUN", "Jun", "June"]),
-                    ("July", ["JUL", "Jul", "July"]),
-                    ("August", ["AUG", "Aug", "August"]),
-                    ("September", ["SEP", "Sept", "SEPT", "September"]),
-                    ("October", ["OCT", "Oct", "October"]),
-                    ("November", ["NOV", "Nov", "November"]),
-                    ("December", ["DEC", "Dec", "December"]),
-                ]
-
-                from datetime import date as _date_cls
                 wide_year_raw = sget(row, "forecast_year", "year_forecast", "year", "Year")
                 try:
-                    wide_year = int(wide_year_raw) if wide_year_raw else _date_cls.today().year
+                    wide_year = int(wide_year_raw) if wide_year_raw else date.today().year
                 except ValueError:
-                    wide_year = _date_cls.today().year
+                    wide_year = date.today().year
 
-                for full_name, aliases in month_columns:
+                for full_name, aliases in _CSV_WIDE_MONTH_COLUMNS:
                     header = None
                     for alias in aliases:
                         if alias in row:
@@ -2223,16 +2374,12 @@ def customer_detail(request, tep_id: int):
     materials = (
         Material.objects
         .filter(tep_code=tep)
+        .only("mat_partcode", "mat_partname", "mat_maker", "unit", "dim_qty", "loss_percent", "total")
         .order_by("mat_partname")
     )
 
     selected_part = (tep.part_code or "").strip()
-    selected_part_name = ""
-
-    for p in (tep.customer.parts or []):
-        if isinstance(p, dict) and str(p.get("Partcode", "")).strip() == selected_part:
-            selected_part_name = str(p.get("Partname", "")).strip()
-            break
+    selected_part_name = tep.customer.parts_map.get(selected_part, "")
 
     return render(request, "customer_detail.html", {
         "customer": tep.customer,
@@ -2283,43 +2430,51 @@ def add_material_to_tep(request):
 
     tep = get_object_or_404(TEPCode, id=tep_id)
 
-    master = MaterialList.objects.filter(mat_partcode=mat_partcode).first()
+    master = (
+        MaterialList.objects
+        .filter(mat_partcode=mat_partcode)
+        .only("mat_partname", "mat_maker", "unit")
+        .first()
+    )
     if not master:
         messages.error(request, f"mat_partcode not found in master list: {mat_partcode}")
         return redirect("app:admin_dashboard")
 
-    total = round(float(dim_qty) * (1 + (float(loss_percent) / 100.0)), 4)
+    total = round(dim_qty * (1 + (loss_percent / 100.0)), 4)
 
     try:
         with transaction.atomic():
-            final_name = _allocate_material_name(
-                tep=tep,
-                base_name=master.mat_partname,
-                exclude_partcode=mat_partcode
-            )
-
-            material, created = Material.objects.get_or_create(
-                tep_code=tep,
-                mat_partcode=mat_partcode,
-                defaults={
-                    "mat_partname": final_name,
-                    "mat_maker": master.mat_maker,
-                    "unit": master.unit,
-                    "dim_qty": dim_qty,
-                    "loss_percent": loss_percent,
-                    "total": total,
-                }
-            )
+            # Lock the TEP so concurrent adds to it can't both pass the
+            # existence check; there is no unique constraint to fall back on.
+            tep = TEPCode.objects.select_for_update().get(pk=tep.pk)
 
-            if not created:
+            if Material.objects.filter(tep_code=tep, mat_partcode=mat_partcode).exists():
                 messages.error(request, f"Material already exists for this TEP + {mat_partcode}.")
             else:
+                # Only allocate once the insert is certain: allocation may
+                # rename an existing "base" row to "base 1".
+                final_name = _allocate_material_name(
+                    tep=tep,
+                    base_name=master.mat_partname,
+                    exclude_partcode=mat_partcode
+                )
+
+                Material.objects.create(
+                    tep_code=tep,
+                    mat_partcode=mat_partcode,
+                    mat_partname=final_name,
+                    mat_maker=master.mat_maker,
+                    unit=master.unit,
+                    dim_qty=dim_qty,
+                    loss_percent=loss_percent,
+                    total=total,
+                )
                 messages.success(request, f"Added material: {mat_partcode}")
 
     except Exception as e:
         messages.error(request, f"Failed to add material: {e}")
 
-    return redirect(reverse("app:admin_dashboard") + "?tab=customers")
+    return redirect(_dashboard_tab_url("customers"))
 
 
 def logout_view(request):